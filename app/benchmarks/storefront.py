@@ -0,0 +1,378 @@
+"""
+Load-test harness and benchmark suite for the Bagel Store storefront.
+
+Boots ``create_app()`` in-process against the local PostgreSQL from
+``docker-compose.yml`` and drives a mix of shopper journeys from concurrent
+virtual users, reporting throughput, p50/p95/p99 latency and database
+queries per request for every route. Results can be saved as a baseline and
+later runs compared against it; a regression makes the comparison exit 1.
+
+Usage (from ``app/``, with ``docker compose up -d postgres`` running)::
+
+    uv run python benchmarks/storefront.py --scenario mixed --save-baseline
+    uv run python benchmarks/storefront.py --scenario mixed --compare
+
+``--url http://localhost:5001`` drives an already running server over HTTP
+instead (any ``SERVER_MODE``); queries per request are only measured
+in-process.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR / 'src'))
+load_dotenv(dotenv_path=APP_DIR / '.env')
+
+BASELINE_DIR = Path(__file__).resolve().parent / 'baselines'
+
+# Redirects are the normal outcome of form posts
+OK_STATUSES = {200, 302}
+
+PRODUCT_LINK = re.compile(r'/cart/add/(\d+)')
+ORDER_LINK = re.compile(r'/order/(\d+)')
+
+_counter = threading.local()
+_counting_factories = {}
+
+
+def _counting_cursor(factory):
+    """Subclass of a cursor factory that counts executed statements per thread"""
+    counting = _counting_factories.get(factory)
+    if counting is None:
+        class CountingCursor(factory):
+            def execute(self, query, vars=None):
+                _counter.queries = getattr(_counter, 'queries', 0) + 1
+                return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                _counter.queries = getattr(_counter, 'queries', 0) + 1
+                return super().executemany(query, vars_list)
+
+        counting = _counting_factories[factory] = CountingCursor
+    return counting
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """Connection whose cursors count statements into the calling thread's counter"""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.pop('cursor_factory', None) or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=_counting_cursor(factory), **kwargs)
+
+
+class InProcessClient:
+    """Drives the Flask app through its test client, counting queries per request"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        _counter.queries = 0
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get('Location', ''), response.get_data(as_text=True), _counter.queries
+
+
+class HttpClient:
+    """Drives a running server over HTTP with keep-alive and a cookie jar"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, data=data, allow_redirects=False)
+        return response.status_code, response.headers.get('Location', ''), response.text, None
+
+
+class Shopper:
+    """One virtual user: a client with its own session, recording every request"""
+
+    def __init__(self, client, recorder, rng):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.product_ids = []
+        self.logged_in = False
+
+    def call(self, label, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, location, body, queries = self.client.request(method, path, data)
+        except Exception:
+            self.recorder.record(label, time.perf_counter() - started, None, ok=False)
+            return None, '', ''
+        self.recorder.record(label, time.perf_counter() - started, queries, ok=status in OK_STATUSES)
+        return status, location, body
+
+    def browse(self):
+        status, location, body = self.call('GET /', 'GET', '/')
+        if body:
+            self.product_ids = sorted({int(product_id) for product_id in PRODUCT_LINK.findall(body)})
+
+    def add_to_cart(self):
+        if not self.product_ids:
+            self.browse()
+        if self.product_ids:
+            product_id = self.rng.choice(self.product_ids)
+            self.call('POST /cart/add/<id>', 'POST', f'/cart/add/{product_id}',
+                      {'quantity': str(self.rng.randint(1, 3))})
+
+    def login(self):
+        if not self.logged_in:
+            status, location, body = self.call('POST /login', 'POST', '/login', {
+                'username': os.environ.get('DEMO_USERNAME', 'demo'),
+                'password': os.environ.get('DEMO_PASSWORD', ''),
+            })
+            self.logged_in = status == 302
+
+
+def journey_browse(shopper):
+    """Catalog page view"""
+    shopper.browse()
+
+
+def journey_shop(shopper):
+    """Browse, add an item, look at the cart"""
+    shopper.browse()
+    shopper.add_to_cart()
+    shopper.call('GET /cart', 'GET', '/cart')
+
+
+def journey_checkout(shopper):
+    """Full purchase: browse, add items, cart, checkout, place order, confirmation"""
+    shopper.login()
+    shopper.browse()
+    shopper.add_to_cart()
+    shopper.add_to_cart()
+    shopper.call('GET /cart', 'GET', '/cart')
+    shopper.call('GET /checkout', 'GET', '/checkout')
+    status, location, body = shopper.call('POST /checkout/place-order', 'POST', '/checkout/place-order')
+    match = ORDER_LINK.search(location or '')
+    if match:
+        shopper.call('GET /order/<id>', 'GET', f'/order/{match.group(1)}')
+
+
+# Weighted journey mixes
+SCENARIOS = {
+    'browse': [(1, journey_browse)],
+    'shop': [(1, journey_shop)],
+    'checkout': [(1, journey_checkout)],
+    'mixed': [(60, journey_browse), (30, journey_shop), (10, journey_checkout)],
+}
+
+
+class Recorder:
+    """Thread-safe collection of per-route latency samples"""
+
+    def __init__(self):
+        self.enabled = False
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds, queries, ok):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._samples.setdefault(label, []).append((seconds, queries, ok))
+
+    def summary(self, elapsed):
+        """Aggregate samples into the results document"""
+        with self._lock:
+            samples = {label: list(rows) for label, rows in self._samples.items()}
+
+        everything = [row for rows in samples.values() for row in rows]
+        results = _summarize(everything, elapsed)
+        results['routes'] = {label: _summarize(rows, elapsed) for label, rows in sorted(samples.items())}
+        return results
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))]
+
+
+def _summarize(rows, elapsed):
+    latencies = sorted(row[0] * 1000 for row in rows)
+    queries = [row[1] for row in rows if row[1] is not None]
+    return {
+        'requests': len(rows),
+        'errors': sum(1 for row in rows if not row[2]),
+        'throughput': len(rows) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.50),
+        'p95_ms': _percentile(latencies, 0.95),
+        'p99_ms': _percentile(latencies, 0.99),
+        'mean_ms': statistics.fmean(latencies) if latencies else None,
+        'queries_per_request': statistics.fmean(queries) if queries else None,
+    }
+
+
+def _fmt(value, pattern='%.2f'):
+    return '-' if value is None else pattern % value
+
+
+def print_report(results):
+    """Per-route results table"""
+    print(f"\nScenario {results['scenario']} ({results['mode']}): {results['users']} users, "
+          f"{results['duration']:.0f}s measured")
+    header = f"{'route':<28} {'reqs':>7} {'errs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}"
+    print(header)
+    print('-' * len(header))
+    for label, stats in list(results['routes'].items()) + [('TOTAL', results)]:
+        print(f"{label:<28} {stats['requests']:>7} {stats['errors']:>5} {_fmt(stats['throughput'], '%.1f'):>8} "
+              f"{_fmt(stats['p50_ms']):>8} {_fmt(stats['p95_ms']):>8} {_fmt(stats['p99_ms']):>8} "
+              f"{_fmt(stats['queries_per_request']):>6}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline`` as a list of messages"""
+    problems = []
+    if results['throughput'] < baseline['throughput'] * (1 - tolerance):
+        problems.append(f"throughput {results['throughput']:.1f} req/s < baseline {baseline['throughput']:.1f}")
+
+    pairs = [('TOTAL', results, baseline)] + [
+        (label, stats, baseline['routes'][label])
+        for label, stats in results['routes'].items()
+        if label in baseline['routes']
+    ]
+    for label, current, previous in pairs:
+        for key in ('p95_ms', 'p99_ms'):
+            if current[key] is not None and previous[key] is not None and current[key] > previous[key] * (1 + tolerance):
+                problems.append(f"{label} {key} {current[key]:.2f} > baseline {previous[key]:.2f}")
+        # Query counts are deterministic, so any increase is a regression
+        if (current['queries_per_request'] is not None and previous['queries_per_request'] is not None
+                and current['queries_per_request'] > previous['queries_per_request'] + 0.01):
+            problems.append(f"{label} queries/request {current['queries_per_request']:.2f} > "
+                            f"baseline {previous['queries_per_request']:.2f}")
+        if current['errors'] > previous['errors']:
+            problems.append(f"{label} errors {current['errors']} > baseline {previous['errors']}")
+    return problems
+
+
+def restock(quantity):
+    """Give every product ``quantity`` units so long checkout runs do not sell out"""
+    from database import run_in_transaction
+    from inventory import get_stripe_count, restripe_inventory
+
+    def work(cursor):
+        cursor.execute('DELETE FROM inventory_stripes')
+        cursor.execute('UPDATE inventory SET quantity = %s, last_updated = NOW()', (quantity,))
+
+    run_in_transaction(work)
+    if get_stripe_count() > 0:
+        restripe_inventory(get_stripe_count())
+
+
+def run(args):
+    """Drive the scenario and return the results document"""
+    if args.url:
+        mode = 'http'
+
+        def make_client():
+            return HttpClient(args.url)
+    else:
+        from app import create_app
+        from database import get_db_url, get_pool_config, install_pool
+        from pool import ConnectionPool
+
+        install_pool(ConnectionPool(get_db_url(), connection_factory=CountingConnection, **get_pool_config()))
+        app = create_app()
+        mode = 'in-process'
+
+        def make_client():
+            return InProcessClient(app)
+
+    if args.restock:
+        restock(args.restock)
+
+    mix = SCENARIOS[args.scenario]
+    weights = [weight for weight, journey in mix]
+    journeys = [journey for weight, journey in mix]
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def user(index):
+        rng = random.Random(args.seed + index)
+        shopper = Shopper(make_client(), recorder, rng)
+        while not stop.is_set():
+            rng.choices(journeys, weights)[0](shopper)
+
+    threads = [threading.Thread(target=user, args=(index,), daemon=True) for index in range(args.users)]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.warmup)
+    recorder.enabled = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.enabled = False
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    results = recorder.summary(elapsed)
+    results.update({'scenario': args.scenario, 'mode': mode, 'users': args.users, 'duration': elapsed})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Bagel Store storefront')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before measuring')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--url', help='Benchmark a running server instead of an in-process app')
+    parser.add_argument('--restock', type=int, metavar='QUANTITY',
+                        help='Reset every product to QUANTITY units first (destructive; local databases only)')
+    parser.add_argument('--output', type=Path, help='Also write the results JSON here')
+    parser.add_argument('--baseline', type=Path, help='Baseline file (default: benchmarks/baselines/<scenario>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='Fail if results regress against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help='Allowed relative throughput/latency regression (default: 0.20)')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print_report(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + '\n')
+
+    baseline_path = args.baseline or BASELINE_DIR / f'{args.scenario}.json'
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'\nBaseline saved to {baseline_path}')
+
+    if args.compare:
+        if not baseline_path.exists():
+            print(f'\nNo baseline at {baseline_path}; run with --save-baseline first')
+            return 2
+        problems = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+        if problems:
+            print(f'\nRegressions against {baseline_path}:')
+            for problem in problems:
+                print(f'  - {problem}')
+            return 1
+        print(f'\nNo regressions against {baseline_path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
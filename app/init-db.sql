@@ -16,6 +16,15 @@ CREATE TABLE IF NOT EXISTS inventory (
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create striped stock counters (optional hot-product striping)
+CREATE TABLE IF NOT EXISTS inventory_stripes (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    stripe SMALLINT NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, stripe)
+);
+
 -- Create orders table
 CREATE TABLE IF NOT EXISTS orders (
     id SERIAL PRIMARY KEY,
@@ -33,6 +42,49 @@ CREATE TABLE IF NOT EXISTS order_items (
     price DECIMAL(10, 2) NOT NULL
 );
 
+-- Create outbox of pending inventory decrements (asynchronous inventory mode)
+CREATE TABLE IF NOT EXISTS inventory_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create server-side session storage (SESSION_BACKEND=postgres)
+CREATE TABLE IF NOT EXISTS sessions (
+    id VARCHAR(64) PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Create daily sales rollup (maintained by the outbox worker)
+CREATE TABLE IF NOT EXISTS daily_sales (
+    sales_date DATE NOT NULL,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    order_count INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (sales_date, product_id)
+);
+
+-- Create outbox of orders not yet folded into the daily sales rollup
+CREATE TABLE IF NOT EXISTS sales_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    sign SMALLINT NOT NULL CHECK (sign IN (1, -1)),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create shared catalog version, bumped by catalog imports
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO catalog_version (id, version) VALUES (1, 0);
+
 -- Insert sample bagel products
 INSERT INTO products (name, description, price) VALUES
 ('Plain Bagel', 'Classic New York style plain bagel, perfect for any topping', 2.50),
@@ -51,3 +103,7 @@ CREATE INDEX idx_order_items_order_id ON order_items(order_id);
 CREATE INDEX idx_order_items_product_id ON order_items(product_id);
 CREATE INDEX idx_orders_status ON orders(status);
 CREATE INDEX idx_orders_date ON orders(order_date);
+CREATE INDEX idx_inventory_outbox_product_id ON inventory_outbox(product_id);
+CREATE INDEX idx_sessions_expires_at ON sessions(expires_at);
+CREATE INDEX idx_orders_status_date_id ON orders(status, order_date, id);
+CREATE INDEX idx_sales_outbox_order_id ON sales_outbox(order_id);
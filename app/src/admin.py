@@ -0,0 +1,346 @@
+"""
+Operations API for the Bagel Store application.
+
+Endpoints under ``/admin`` for kitchen screens, fulfillment tooling, sales
+reporting and bulk catalog imports.
+Callers authenticate with an ``Authorization: Bearer <token>`` header when
+``ADMIN_API_TOKEN`` is set, or with an admin session opened by
+``POST /admin/login`` using ``ADMIN_USERNAME``/``ADMIN_PASSWORD``; a
+storefront login grants no admin access. Session-authenticated writes must
+echo the session's CSRF token in an ``X-CSRF-Token`` header. Catalog imports
+accept the bearer token only.
+"""
+
+import csv
+import hmac
+import io
+import json
+import os
+import secrets
+from dataclasses import asdict
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from flask import Blueprint, Response, jsonify, request, session, stream_with_context
+
+from catalog_import import CatalogImportError, import_catalog
+from fulfillment import ORDER_STATUSES, InvalidTransitionError, get_order_queue, transition_orders
+from pagination import InvalidCursorError, get_page_limit
+from replicas import pin_to_primary
+from reports import get_daily_sales, get_order_history, get_product_sales, stream_order_lines
+from sessions import regenerate_session
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+# Characters of a streamed download buffered before a chunk is sent
+CHUNK_SIZE = 64 * 1024
+
+ADMIN_SESSION_KEY = 'admin_user'
+CSRF_SESSION_KEY = 'admin_csrf_token'
+CSRF_HEADER = 'X-CSRF-Token'
+
+# Methods a cross-site page can trigger but that change nothing
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class InvalidArgumentError(ValueError):
+    """Raised for a malformed query string argument"""
+
+
+def has_api_token():
+    """Whether the request carries the ``ADMIN_API_TOKEN`` bearer token"""
+    token = os.environ.get('ADMIN_API_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def _matches(value, expected):
+    return bool(expected) and hmac.compare_digest((value or '').encode(), expected.encode())
+
+
+@bp.before_request
+def require_admin():
+    """Reject callers holding neither the API token nor an admin session, and session writes without the CSRF token"""
+    if request.endpoint == 'admin.login' or has_api_token():
+        return None
+    if not session.get(ADMIN_SESSION_KEY):
+        return jsonify({'error': 'Authentication required'}), 401
+    # Browsers attach the session cookie to cross-site requests, but cannot read the token
+    if request.method not in SAFE_METHODS and not _matches(request.headers.get(CSRF_HEADER),
+                                                           session.get(CSRF_SESSION_KEY)):
+        return jsonify({'error': 'Missing or invalid CSRF token'}), 403
+    return None
+
+
+@bp.route('/login', methods=['POST'])
+def login():
+    """Open an admin session: ``{"username": ..., "password": ...}``; returns the CSRF token for writes"""
+    payload = request.get_json(silent=True) or request.form
+    username = os.environ.get('ADMIN_USERNAME')
+    if not (_matches(payload.get('username'), username)
+            and _matches(payload.get('password'), os.environ.get('ADMIN_PASSWORD'))):
+        return jsonify({'error': 'Invalid credentials'}), 401
+
+    # A session id planted before login must not carry admin rights
+    regenerate_session(session)
+    session[ADMIN_SESSION_KEY] = username
+    session[CSRF_SESSION_KEY] = secrets.token_urlsafe(32)
+    return jsonify({'user': username, 'csrf_token': session[CSRF_SESSION_KEY]})
+
+
+@bp.route('/logout', methods=['POST'])
+def logout():
+    """End the admin session; the storefront login, if any, is kept"""
+    session.pop(ADMIN_SESSION_KEY, None)
+    session.pop(CSRF_SESSION_KEY, None)
+    regenerate_session(session)
+    return jsonify({'status': 'logged out'})
+
+
+@bp.errorhandler(InvalidTransitionError)
+@bp.errorhandler(InvalidCursorError)
+@bp.errorhandler(InvalidArgumentError)
+@bp.errorhandler(CatalogImportError)
+def bad_request(error):
+    return jsonify({'error': str(error)}), 400
+
+
+def order_json(order, items=None):
+    """JSON-ready dict for an Order"""
+    data = {
+        'id': order.id,
+        'order_date': order.order_date.isoformat() if order.order_date else None,
+        'total_amount': order.total_amount,
+        'status': order.status,
+    }
+    if items is not None:
+        data['items'] = items
+    return data
+
+
+def date_arg(name, default):
+    """ISO date from the query string"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidArgumentError(f'{name} must be a YYYY-MM-DD date') from None
+
+
+def _closing(source, chunks):
+    """Yield ``chunks``, closing ``source`` (e.g. StreamedRows) when done or when the client goes away"""
+    try:
+        yield from chunks
+    finally:
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
+
+
+def _attachment(chunks, mimetype, filename, source=None):
+    return Response(
+        stream_with_context(_closing(source, chunks)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+def csv_response(filename, header, rows, source=None):
+    """Stream ``rows`` as a CSV attachment, sent in chunks of about CHUNK_SIZE bytes.
+
+    ``source`` is closed when the download ends or is aborted.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return _attachment(generate(), 'text/csv', filename, source)
+
+
+def ndjson_response(filename, records, source=None):
+    """Stream ``records`` as newline-delimited JSON, sent in chunks of about CHUNK_SIZE bytes"""
+    def generate():
+        lines = []
+        size = 0
+        for record in records:
+            line = json.dumps(record, separators=(',', ':')) + '\n'
+            lines.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield ''.join(lines)
+                lines = []
+                size = 0
+        yield ''.join(lines)
+
+    return _attachment(generate(), 'application/x-ndjson', filename, source)
+
+
+@bp.route('/orders')
+def order_history():
+    """Newest-first page of orders, optionally in one status"""
+    status = request.args.get('status') or None
+    if status is not None and status not in ORDER_STATUSES:
+        raise InvalidArgumentError(f'Unknown order status: {status!r}')
+    orders, next_cursor = get_order_history(
+        after=request.args.get('after') or None,
+        limit=get_page_limit(request.args.get('limit')),
+        status=status
+    )
+    return jsonify({'orders': [order_json(order) for order in orders], 'next': next_cursor})
+
+
+@bp.route('/orders/export')
+def export_orders():
+    """Stream orders placed between ``start`` and ``end`` (inclusive dates, default: all).
+
+    ``format=csv`` (default) writes one row per order line; ``format=ndjson``
+    one JSON object per order with its items.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        raise InvalidArgumentError('format must be csv or ndjson')
+    status = request.args.get('status') or None
+    if status is not None and status not in ORDER_STATUSES:
+        raise InvalidArgumentError(f'Unknown order status: {status!r}')
+    start = date_arg('start', None)
+    end = date_arg('end', None)
+
+    # Opened before the response starts, so a database error is a 5xx, not a truncated file
+    rows = stream_order_lines(start, end, status)
+    filename = 'orders-%s-%s.%s' % (start or 'all', end or date.today(), export_format)
+
+    if export_format == 'csv':
+        return csv_response(
+            filename,
+            ['order_id', 'order_date', 'status', 'total_amount', 'product_id', 'product_name', 'quantity', 'price'],
+            ((row[0], row[1].isoformat(), row[2], row[3], row[4], row[5], row[6], row[7]) for row in rows),
+            source=rows
+        )
+
+    def orders():
+        for order_id, lines in groupby(rows, key=lambda row: row[0]):
+            first = next(lines)
+            yield {
+                'id': order_id,
+                'order_date': first[1].isoformat(),
+                'status': first[2],
+                'total_amount': str(first[3]),
+                'items': [
+                    {'product_id': row[4], 'product_name': row[5], 'quantity': row[6], 'price': str(row[7])}
+                    for row in [first, *lines]
+                ],
+            }
+
+    return ndjson_response(filename, orders(), source=rows)
+
+
+@bp.route('/reports/sales')
+def sales_report():
+    """Sales per day (or per day and product with ``by=product``) from the daily rollup.
+
+    ``start``/``end`` are inclusive dates (default: the last 30 days);
+    ``format=csv`` streams the report as a download.
+    """
+    end = date_arg('end', date.today())
+    start = date_arg('start', end - timedelta(days=29))
+    if start > end:
+        raise InvalidArgumentError('start must not be after end')
+    by_product = request.args.get('by') == 'product'
+    as_csv = request.args.get('format') == 'csv'
+
+    if by_product:
+        sales = get_product_sales(start, end)
+        if as_csv:
+            return csv_response(
+                f'sales-by-product-{start}-{end}.csv',
+                ['sales_date', 'product_id', 'product_name', 'order_count', 'quantity', 'revenue'],
+                ((row.sales_date.isoformat(), row.product_id, row.product_name, row.order_count, row.quantity,
+                  row.revenue) for row in sales)
+            )
+        sales = [dict(asdict(row), sales_date=row.sales_date.isoformat()) for row in sales]
+    else:
+        sales = get_daily_sales(start, end)
+        if as_csv:
+            return csv_response(
+                f'sales-{start}-{end}.csv',
+                ['sales_date', 'order_lines', 'quantity', 'revenue'],
+                ((row['sales_date'].isoformat(), row['order_lines'], row['quantity'], row['revenue'])
+                 for row in sales)
+            )
+        sales = [dict(row, sales_date=row['sales_date'].isoformat()) for row in sales]
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'revenue': sum((row['revenue'] for row in sales), Decimal('0.00')),
+        'quantity': sum(row['quantity'] for row in sales),
+        'sales': sales,
+    })
+
+
+@bp.route('/orders/queue')
+def order_queue():
+    """Oldest-first page of orders in a status (default: pending) with their items"""
+    orders, items_by_order_id, next_cursor = get_order_queue(
+        request.args.get('status', 'pending'),
+        after=request.args.get('after') or None,
+        limit=get_page_limit(request.args.get('limit'))
+    )
+    return jsonify({
+        'orders': [order_json(order, items_by_order_id[order.id]) for order in orders],
+        'next': next_cursor,
+    })
+
+
+@bp.route('/orders/status', methods=['POST'])
+def update_order_status():
+    """Move orders to a new status: ``{"order_ids": [...], "status": "...", "from_status": optional}``"""
+    payload = request.get_json(silent=True) or {}
+    order_ids = payload.get('order_ids')
+    if not isinstance(order_ids, list) or not all(isinstance(order_id, int) for order_id in order_ids):
+        return jsonify({'error': 'order_ids must be a list of integers'}), 400
+
+    updated, skipped = transition_orders(order_ids, payload.get('status'), payload.get('from_status'))
+    # The caller will poll the queue next; make sure it sees its own change
+    pin_to_primary()
+    return jsonify({'status': payload.get('status'), 'updated': updated, 'skipped': skipped})
+
+
+@bp.route('/orders/<int:order_id>/status', methods=['POST'])
+def update_single_order_status(order_id):
+    """Move one order: ``{"status": "...", "from_status": optional}``; 409 if it could not move"""
+    payload = request.get_json(silent=True) or {}
+    updated, skipped = transition_orders([order_id], payload.get('status'), payload.get('from_status'))
+    pin_to_primary()
+    if not updated:
+        return jsonify({'error': f'Order {order_id} not found or cannot move to {payload.get("status")!r}'}), 409
+    return jsonify({'status': payload.get('status'), 'updated': updated, 'skipped': skipped})
+
+
+@bp.route('/catalog/import', methods=['POST'])
+def import_catalog_files():
+    """Bulk-load ``products`` and/or ``inventory`` CSV uploads (multipart) in one transaction.
+
+    Requires the API token: a multipart form is what any site can make a
+    logged-in browser submit, and an import rewrites prices and stock.
+    """
+    if not has_api_token():
+        return jsonify({'error': 'Catalog imports require the API token'}), 403
+    products = request.files.get('products')
+    inventory = request.files.get('inventory')
+    counts = import_catalog(
+        products.stream if products else None,
+        inventory.stream if inventory else None,
+        inventory_mode=request.form.get('inventory_mode', 'set')
+    )
+    return jsonify(counts)
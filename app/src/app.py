@@ -18,14 +18,50 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['SESSION_COOKIE_HTTPONLY'] = True
 
+    # Load compiled templates from the on-disk bytecode cache
+    import templating
+    templating.init_app(app)
+
+    # One pooled connection per request, released at teardown
+    import database
+    database.init_app(app)
+
+    # Request latency histograms and counters for /metrics
+    import metrics
+    metrics.init_app(app)
+
+    # Keep session data server-side when SESSION_BACKEND is set
+    import sessions
+    sessions.init_app(app)
+
     # Register blueprints
     from routes import bp
     app.register_blueprint(bp)
 
+    import admin
+    app.register_blueprint(admin.bp)
+
+    from cli import register_commands
+    register_commands(app)
+
+    # Shed load instead of queueing when every pooled connection is busy
+    from pool import PoolExhaustedError
+
+    @app.errorhandler(PoolExhaustedError)
+    def pool_exhausted(error):
+        return 'Service temporarily unavailable, please retry', 503, {'Retry-After': '1'}
+
     return app
 
 
 if __name__ == '__main__':
     app = create_app()
+
+    # Apply deferred inventory and sales rollup updates in the background
+    # unless a separate `flask drain-outbox` process is doing it
+    from outbox import should_start_worker, start_outbox_worker
+    if should_start_worker():
+        start_outbox_worker()
+
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_ENV') == 'development')
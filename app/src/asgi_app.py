@@ -0,0 +1,332 @@
+"""
+ASGI variant of the Bagel Store storefront (``SERVER_MODE=asgi``).
+
+The same routes as ``routes.py`` run on Quart with an asyncpg pool, so one
+worker process serves as many concurrent requests as it has pooled
+connections instead of one per thread. Models, templates, the catalog cache
+and the cart helpers are shared with the Flask app.
+
+Checkout, and the Postgres/SQLite session stores when ``SESSION_BACKEND`` is
+set, still run the psycopg2 code in a worker thread, so there is a single
+implementation of order placement and inventory reservation.
+"""
+
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from markupsafe import Markup
+from quart import Blueprint, Quart, jsonify, redirect, render_template, request, session, url_for
+from quart.sessions import SessionInterface
+
+# Load environment variables before routes reads the demo credentials
+load_dotenv()
+
+from async_catalog import get_all_products, get_catalog_version, get_products_by_ids
+from async_database import close_async_pool, fetch, fetchrow, get_async_pool, open_async_pool
+from cart import (
+    InvalidQuantityError, clear_cart, merge_item, needs_reprice, parse_quantity, price_lines, remove_item, reprice_items
+)
+from catalog import compute_catalog_version, get_fragment, set_fragment
+from health import REQUIRED_TABLES, readiness_failure, readiness_result
+from inventory import InsufficientStockError
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, init_asgi_app as init_metrics, render_metrics
+from models import Order
+from orders import create_order
+from pool import PoolExhaustedError
+from routes import DEMO_PASSWORD, DEMO_USERNAME
+from sessions import regenerate_session
+
+bp = Blueprint('main', __name__)
+
+
+async def load_cart():
+    """Cart entries from the session, re-priced first if the catalog has changed"""
+    items = session.get('cart', [])
+    if not items:
+        return items
+
+    version = await get_catalog_version()
+    if needs_reprice(session, items, version):
+        products_by_id = await get_products_by_ids(item['product_id'] for item in items)
+        items = reprice_items(items, products_by_id)
+        session['cart'] = items
+        session['cart_version'] = version
+    return items
+
+
+async def build_cart_lines(items):
+    """Cart lines for rendering, priced from the session snapshots"""
+    return price_lines(items, await get_products_by_ids(item['product_id'] for item in items))
+
+
+@bp.route('/')
+async def index():
+    """Homepage - product catalog"""
+    grid = get_fragment('product_grid', await get_catalog_version())
+    if grid is None:
+        products_list = await get_all_products()
+        grid = Markup(await render_template('product_grid.html', products=products_list))
+        set_fragment('product_grid', compute_catalog_version(products_list), grid)
+
+    return await render_template('index.html', product_grid=grid)
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+async def login():
+    """Login page"""
+    if request.method == 'POST':
+        form = await request.form
+        username = form.get('username')
+        password = form.get('password')
+
+        if username == DEMO_USERNAME and password == DEMO_PASSWORD:
+            regenerate_session(session)
+            session['user'] = username
+            return redirect(url_for('main.index'))
+        else:
+            return await render_template('login.html', error='Invalid credentials')
+
+    return await render_template('login.html', demo_username=DEMO_USERNAME)
+
+
+@bp.route('/logout')
+async def logout():
+    """Logout"""
+    session.pop('user', None)
+    regenerate_session(session)
+    return redirect(url_for('main.index'))
+
+
+@bp.route('/cart')
+async def cart():
+    """Shopping cart"""
+    cart_items = await load_cart()
+    products, total = await build_cart_lines(cart_items)
+
+    return await render_template('cart.html', items=products, total=total)
+
+
+@bp.route('/cart/add/<int:product_id>', methods=['POST'])
+async def add_to_cart(product_id):
+    """Add product to cart"""
+    form = await request.form
+    try:
+        quantity = parse_quantity(form.get('quantity', 1))
+    except InvalidQuantityError as e:
+        return str(e), 400
+
+    product = (await get_products_by_ids([product_id])).get(product_id)
+    if product:
+        session['cart'] = merge_item(await load_cart(), product, quantity)
+        session['cart_version'] = await get_catalog_version()
+
+    return redirect(url_for('main.cart'))
+
+
+@bp.route('/cart/remove/<int:product_id>', methods=['POST'])
+async def remove_from_cart(product_id):
+    """Remove product from cart"""
+    remove_item(session, product_id)
+    return redirect(url_for('main.cart'))
+
+
+@bp.route('/checkout', methods=['GET'])
+async def checkout():
+    """Checkout page - display order summary"""
+    if 'user' not in session:
+        return redirect(url_for('main.login'))
+
+    cart_items = await load_cart()
+    products, total = await build_cart_lines(cart_items)
+
+    return await render_template('checkout.html', items=products, total=total)
+
+
+@bp.route('/checkout/place-order', methods=['POST'])
+async def place_order():
+    """Process checkout and create order"""
+    if 'user' not in session:
+        return redirect(url_for('main.login'))
+
+    cart = await load_cart()
+
+    if not cart:
+        return redirect(url_for('main.index'))
+
+    try:
+        # Order placement keeps its retrying psycopg2 transaction; run it off the event loop
+        order_id = await asyncio.to_thread(create_order, cart)
+    except InsufficientStockError as e:
+        # Keep the cart so the customer can adjust quantities
+        products, total = await build_cart_lines(cart)
+        names = {line['product'].id: line['product'].name for line in products}
+        error = 'Not enough stock to complete your order: ' + ', '.join(
+            '%s (%d left)' % (names.get(product_id, 'product %d' % product_id), available)
+            for product_id, (requested, available) in sorted(e.shortages.items())
+        )
+        return await render_template('cart.html', items=products, total=total, error=error), 409
+    except InvalidQuantityError as e:
+        products, total = await build_cart_lines(cart)
+        return await render_template('cart.html', items=products, total=total, error=str(e)), 400
+
+    clear_cart(session)
+
+    if order_id is None:
+        return redirect(url_for('main.index'))
+
+    return redirect(url_for('main.order_confirmation', order_id=order_id))
+
+
+@bp.route('/order/<int:order_id>')
+async def order_confirmation(order_id):
+    """Order confirmation page"""
+    order_row = await fetchrow(
+        'SELECT id, order_date, total_amount, status FROM orders WHERE id = $1',
+        order_id
+    )
+
+    if not order_row:
+        return redirect(url_for('main.index'))
+
+    order = Order.from_db_row(order_row)
+
+    items_rows = await fetch(
+        '''SELECT oi.id, oi.order_id, oi.product_id, oi.quantity, oi.price, p.name
+           FROM order_items oi
+           JOIN products p ON oi.product_id = p.id
+           WHERE oi.order_id = $1''',
+        order_id
+    )
+
+    items = []
+    for row in items_rows:
+        items.append({
+            'product_name': row[5],
+            'quantity': row[3],
+            'price': row[4],
+            'subtotal': row[4] * row[3]
+        })
+
+    return await render_template('order_confirmation.html', order=order, items=items)
+
+
+_readiness = None
+_readiness_at = 0.0
+
+
+async def check_readiness():
+    """Database and schema status as ``(checks, http_status)``, cached for ``HEALTH_CACHE_TTL`` seconds"""
+    global _readiness, _readiness_at
+    ttl = float(os.environ.get('HEALTH_CACHE_TTL', '5'))
+    if _readiness is not None and time.monotonic() - _readiness_at < ttl:
+        return _readiness
+
+    try:
+        rows = await fetch(
+            '''SELECT t.name FROM unnest($1::text[]) WITH ORDINALITY AS t(name, position)
+               WHERE to_regclass('public.' || t.name) IS NOT NULL
+               ORDER BY t.position''',
+            REQUIRED_TABLES
+        )
+    except Exception as e:
+        result = readiness_failure(e)
+    else:
+        result = readiness_result([row[0] for row in rows])
+
+    _readiness, _readiness_at = result, time.monotonic()
+    return result
+
+
+@bp.route('/health')
+@bp.route('/health/ready')
+async def health():
+    """Readiness check - verifies database connectivity and schema (cached briefly)"""
+    checks, status_code = await check_readiness()
+    return jsonify(checks), status_code
+
+
+@bp.route('/health/live')
+async def health_live():
+    """Liveness check - the process is up and serving requests; no database access"""
+    return jsonify({'status': 'alive'}), 200
+
+
+@bp.route('/metrics')
+async def prometheus_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return render_metrics(async_pool=get_async_pool()), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
+
+@bp.route('/version')
+async def version():
+    """Version info endpoint for deployment verification"""
+    version_info = {
+        'application': 'bagel-store',
+        'version': os.getenv('APP_VERSION', '1.0.0'),
+        'environment': os.getenv('FLASK_ENV', 'production'),
+        'demo_id': os.getenv('DEMO_ID', 'local')
+    }
+    return jsonify(version_info), 200
+
+
+class ThreadedSessionInterface(SessionInterface):
+    """Runs a blocking server-side session interface in a worker thread"""
+
+    def __init__(self, interface):
+        self.interface = interface
+
+    async def open_session(self, app, request):
+        return await asyncio.to_thread(self.interface.open_session, app, request)
+
+    async def save_session(self, app, session, response):
+        await asyncio.to_thread(self.interface.save_session, app, session, response)
+
+
+def create_asgi_app():
+    """Application factory for the ASGI storefront"""
+    app = Quart(__name__)
+
+    # Configuration
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+
+    # Request latency histograms and counters for /metrics
+    init_metrics(app)
+
+    from templating import compile_templates, init_app as init_templating
+    init_templating(app, is_async=True)
+
+    # Reuse the configured server-side session store, if any
+    from sessions import ServerSideSessionInterface, get_session_lifetime, get_session_store
+    store = get_session_store()
+    if store is not None:
+        app.session_interface = ThreadedSessionInterface(
+            ServerSideSessionInterface(store, get_session_lifetime())
+        )
+
+    app.register_blueprint(bp)
+
+    from outbox import should_start_worker, start_outbox_worker, stop_outbox_worker
+
+    @app.before_serving
+    async def startup():
+        compile_templates(app)
+        await open_async_pool()
+        if should_start_worker():
+            start_outbox_worker()
+
+    @app.after_serving
+    async def shutdown():
+        from database import close_pool
+        stop_outbox_worker()
+        await close_async_pool()
+        close_pool()
+
+    # Shed load instead of queueing when every pooled connection is busy
+    @app.errorhandler(PoolExhaustedError)
+    async def pool_exhausted(error):
+        return 'Service temporarily unavailable, please retry', 503, {'Retry-After': '1'}
+
+    return app
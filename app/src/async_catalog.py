@@ -0,0 +1,97 @@
+"""
+Async product catalog lookups for the ASGI storefront.
+
+Shares the process-wide cache from ``catalog.py``, so hit ratios, TTLs,
+``invalidate_catalog()`` and the shared ``catalog_version`` check behave the
+same in both serving modes.
+"""
+
+import asyncio
+
+from async_database import fetch
+from catalog import ALL_PRODUCTS, CATALOG_VERSION, SHARED_VERSION_QUERY, compute_catalog_version, get_catalog_cache
+from models import Product
+
+_load_lock = None
+
+
+def _get_load_lock():
+    # Created lazily so it binds to the running event loop
+    global _load_lock
+    if _load_lock is None:
+        _load_lock = asyncio.Lock()
+    return _load_lock
+
+
+async def _check_shared_version():
+    cache = get_catalog_cache()
+    if cache.version_check_due():
+        rows = await fetch(SHARED_VERSION_QUERY)
+        cache.observe_version(rows[0][0] if rows else None)
+
+
+async def get_catalog_version():
+    """Version stamp of the current catalog; changes whenever a price or product changes"""
+    await _check_shared_version()
+    cache = get_catalog_cache()
+    hit, version = cache.get(CATALOG_VERSION)
+    if hit:
+        return version
+
+    products = await get_all_products()
+    hit, version = cache.get(CATALOG_VERSION)
+    if hit:
+        return version
+    return compute_catalog_version(products)
+
+
+async def get_all_products():
+    """All products ordered by name"""
+    await _check_shared_version()
+    cache = get_catalog_cache()
+    hit, products = cache.get(ALL_PRODUCTS)
+    if hit:
+        return list(products)
+
+    # Only one task reloads an expired catalog; the rest wait for its result
+    async with _get_load_lock():
+        hit, products = cache.get(ALL_PRODUCTS)
+        if hit:
+            return list(products)
+
+        rows = await fetch('SELECT id, name, description, price FROM products ORDER BY name')
+        products = tuple(Product.from_db_row(row) for row in rows)
+
+        if len(products) < cache.max_size - 1:
+            cache.set(CATALOG_VERSION, compute_catalog_version(products))
+            cache.set(ALL_PRODUCTS, products)
+            for product in products:
+                cache.set(product.id, product)
+
+    return list(products)
+
+
+async def get_products_by_ids(ids):
+    """Fetch several products keyed by product id, querying only cache misses in one batch"""
+    await _check_shared_version()
+    cache = get_catalog_cache()
+    products_by_id = {}
+    missing = []
+    for product_id in sorted({int(product_id) for product_id in ids}):
+        hit, product = cache.get(product_id)
+        if hit:
+            products_by_id[product_id] = product
+        else:
+            missing.append(product_id)
+
+    if missing:
+        rows = await fetch(
+            'SELECT id, name, description, price FROM products WHERE id = ANY($1::int[])',
+            missing
+        )
+        for row in rows:
+            product = Product.from_db_row(row)
+            cache.set(product.id, product)
+            products_by_id[product.id] = product
+
+    return products_by_id
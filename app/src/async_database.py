@@ -0,0 +1,85 @@
+"""
+Async database access for the ASGI storefront (``SERVER_MODE=asgi``).
+
+Uses an asyncpg connection pool sized by the same ``DB_POOL_*`` settings as
+the psycopg2 pool. Queries use asyncpg's ``$1`` placeholders; rows support
+positional access, so the ``from_db_row`` constructors in ``models.py``
+work unchanged.
+"""
+
+import asyncio
+
+import asyncpg
+
+from database import get_db_url, get_pool_config
+from pool import PoolExhaustedError
+
+_pool = None
+
+
+async def open_async_pool():
+    """Create the process-wide asyncpg pool and open its minimum connections"""
+    global _pool
+    if _pool is None:
+        config = get_pool_config()
+        _pool = await asyncpg.create_pool(
+            get_db_url(),
+            min_size=config['min_size'],
+            max_size=config['max_size'],
+            max_inactive_connection_lifetime=config['idle_timeout'],
+        )
+    return _pool
+
+
+async def close_async_pool():
+    """Close all pooled connections (e.g. on shutdown)"""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+def get_async_pool():
+    """Get the pool opened by ``open_async_pool()``"""
+    if _pool is None:
+        raise RuntimeError('Async connection pool is not open')
+    return _pool
+
+
+class _Acquire:
+    """Pool checkout that raises PoolExhaustedError after ``DB_POOL_TIMEOUT`` seconds"""
+
+    def __init__(self):
+        self.pool = get_async_pool()
+        self.conn = None
+
+    async def __aenter__(self):
+        timeout = get_pool_config()['timeout']
+        try:
+            # A zero timeout still has to let an idle connection be handed over
+            self.conn = await self.pool.acquire(timeout=max(timeout, 0.001))
+        except asyncio.TimeoutError:
+            raise PoolExhaustedError(
+                f'No connection available within {timeout}s (max_size={self.pool.get_max_size()})'
+            ) from None
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.pool.release(self.conn)
+
+
+def acquire():
+    """Async context manager checking a connection out of the pool"""
+    return _Acquire()
+
+
+async def fetch(query, *args):
+    """Execute a query and return all rows"""
+    async with acquire() as conn:
+        return await conn.fetch(query, *args)
+
+
+async def fetchrow(query, *args):
+    """Execute a query and return a single row"""
+    async with acquire() as conn:
+        return await conn.fetchrow(query, *args)
@@ -0,0 +1,136 @@
+"""
+Session shopping cart for the Bagel Store application.
+
+The cart lives in the session as a list of ``{'product_id', 'quantity',
+'price'}`` entries, where ``price`` is a snapshot taken when the item was
+added, plus ``cart_version``: the catalog version the snapshots belong to.
+While the catalog version is unchanged, cart and checkout pages are built
+from the snapshots and the in-memory catalog without querying the database;
+a stale stamp re-prices every entry once.
+
+Helpers that take already-fetched products (``reprice_items``,
+``merge_item``, ``price_lines``) are shared with the async storefront.
+"""
+
+from decimal import Decimal
+
+from catalog import get_catalog_version, get_products_by_ids
+
+
+class InvalidQuantityError(ValueError):
+    """Raised for a cart quantity that is not a whole number of at least 1"""
+
+
+def parse_quantity(value):
+    """Quantity from a form field or session entry; raises InvalidQuantityError unless it is >= 1"""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise InvalidQuantityError(f'Invalid quantity: {value!r}') from None
+    if quantity < 1:
+        raise InvalidQuantityError(f'Quantity must be at least 1, got {quantity}')
+    return quantity
+
+
+def snapshot_price(price):
+    """Session-safe representation of a product price"""
+    return str(price)
+
+
+def parse_price(snapshot):
+    """Exact price from a session snapshot"""
+    return Decimal(snapshot)
+
+
+def reprice_cart(items):
+    """Refresh price snapshots from the catalog, dropping products that no longer exist"""
+    return reprice_items(items, get_products_by_ids(item['product_id'] for item in items))
+
+
+def reprice_items(items, products_by_id):
+    """Cart entries with price snapshots taken from ``products_by_id``"""
+    return [
+        {
+            'product_id': item['product_id'],
+            'quantity': item['quantity'],
+            'price': snapshot_price(products_by_id[item['product_id']].price)
+        }
+        for item in items
+        if item['product_id'] in products_by_id
+    ]
+
+
+def load_cart(session):
+    """Cart entries from the session, re-priced first if the catalog has changed"""
+    items = session.get('cart', [])
+    if not items:
+        return items
+
+    version = get_catalog_version()
+    if needs_reprice(session, items, version):
+        items = reprice_cart(items)
+        session['cart'] = items
+        session['cart_version'] = version
+    return items
+
+
+def needs_reprice(session, items, version):
+    """Whether the session's price snapshots predate catalog ``version``"""
+    return session.get('cart_version') != version or any('price' not in item for item in items)
+
+
+def add_item(session, product, quantity):
+    """Add ``quantity`` of ``product`` to the session cart"""
+    session['cart'] = merge_item(load_cart(session), product, quantity)
+    session['cart_version'] = get_catalog_version()
+
+
+def merge_item(items, product, quantity):
+    """Cart entries with ``quantity`` of ``product`` added"""
+    for item in items:
+        if item['product_id'] == product.id:
+            item['quantity'] += quantity
+            break
+    else:
+        items.append({
+            'product_id': product.id,
+            'quantity': quantity,
+            'price': snapshot_price(product.price)
+        })
+    return items
+
+
+def remove_item(session, product_id):
+    """Remove every entry for ``product_id`` from the session cart"""
+    session['cart'] = [item for item in session.get('cart', []) if item['product_id'] != product_id]
+
+
+def clear_cart(session):
+    """Empty the session cart"""
+    session['cart'] = []
+    session.pop('cart_version', None)
+
+
+def build_cart_lines(items):
+    """Cart lines for rendering, priced from the session snapshots"""
+    return price_lines(items, get_products_by_ids(item['product_id'] for item in items))
+
+
+def price_lines(items, products_by_id):
+    """Cart lines and total for entries whose products are in ``products_by_id``"""
+    lines = []
+    total = Decimal('0.00')
+    for item in items:
+        product = products_by_id.get(item['product_id'])
+        if product:
+            price = parse_price(item['price'])
+            subtotal = price * item['quantity']
+            lines.append({
+                'product': product,
+                'price': price,
+                'quantity': item['quantity'],
+                'subtotal': subtotal
+            })
+            total += subtotal
+
+    return lines, total
@@ -0,0 +1,231 @@
+"""
+Product catalog lookups for the Bagel Store application.
+
+Products change only through Liquibase seed changesets or bulk imports, so
+lookups are served from an in-process cache that expires after
+``CATALOG_CACHE_TTL`` seconds or when ``invalidate_catalog()`` is called.
+
+Imports bump the single ``catalog_version`` row (changeset
+014-create-catalog-version) in their transaction. Every process reads that row
+at most once per ``CATALOG_VERSION_CHECK_INTERVAL`` seconds and drops its
+cache when the number changed, so an import through one worker reaches the
+others within the interval instead of the TTL.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database import register_statement
+from models import Product
+from replicas import read_prepared, read_query
+
+# Cache keys for the full catalog listing and its version (product ids use integer keys)
+ALL_PRODUCTS = 'all'
+CATALOG_VERSION = 'version'
+# Rendered HTML fragments are cached under (FRAGMENT, name, catalog version)
+FRAGMENT = 'fragment'
+
+
+# The shared counter every import bumps
+SHARED_VERSION_QUERY = 'SELECT version FROM catalog_version WHERE id = 1'
+
+
+class CatalogCache:
+    """Thread-safe TTL cache with LRU eviction and hit/miss counters"""
+
+    def __init__(self, ttl=60.0, max_size=1000, check_interval=1.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared_version = None
+        self._next_check = 0.0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, key):
+        """Return ``(True, value)`` on a fresh hit, ``(False, None)`` otherwise"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries past ``max_size``"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def version_check_due(self):
+        """Whether the caller should read the shared version now; only one caller per interval is told so"""
+        with self._lock:
+            now = time.monotonic()
+            if not self.enabled or now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+            return True
+
+    def observe_version(self, version):
+        """Drop every entry if the shared version moved since the last check"""
+        with self._lock:
+            if self._shared_version is not None and version != self._shared_version:
+                self._entries.clear()
+            self._shared_version = version
+
+    def invalidate(self, key=None):
+        """Drop one entry, or everything when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Snapshot of cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = CatalogCache(
+    ttl=float(os.environ.get('CATALOG_CACHE_TTL', '60')),
+    max_size=int(os.environ.get('CATALOG_CACHE_MAX_SIZE', '1000')),
+    check_interval=float(os.environ.get('CATALOG_VERSION_CHECK_INTERVAL', '1')),
+)
+_load_lock = threading.Lock()
+
+
+def get_catalog_cache():
+    """Get the process-wide catalog cache"""
+    return _cache
+
+
+def invalidate_catalog():
+    """Invalidation hook: call after products or prices change"""
+    _cache.invalidate()
+
+
+def bump_catalog_version(cursor):
+    """Tell every process to drop its catalog cache once the caller's transaction commits"""
+    cursor.execute('UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1')
+
+
+def _check_shared_version():
+    if _cache.version_check_due():
+        rows = read_query(SHARED_VERSION_QUERY)
+        _cache.observe_version(rows[0][0] if rows else None)
+
+
+def compute_catalog_version(products):
+    """Stable stamp over every product field, identical in every worker process"""
+    digest = hashlib.sha1()
+    for product in sorted(products, key=lambda p: p.id):
+        digest.update(f'{product.id}:{product.price}:{product.name}:{product.description};'.encode())
+    return digest.hexdigest()[:12]
+
+
+def get_fragment(name, version):
+    """Cached HTML fragment ``name`` rendered for catalog ``version``, or None"""
+    hit, html = _cache.get((FRAGMENT, name, version))
+    return html if hit else None
+
+
+def set_fragment(name, version, html):
+    """Cache HTML rendered from the catalog at ``version``; dropped with the rest of the catalog"""
+    _cache.set((FRAGMENT, name, version), html)
+
+
+def get_catalog_version():
+    """Version stamp of the current catalog; changes whenever a price or product changes"""
+    _check_shared_version()
+    hit, version = _cache.get(CATALOG_VERSION)
+    if hit:
+        return version
+
+    products = get_all_products()
+    hit, version = _cache.get(CATALOG_VERSION)
+    if hit:
+        return version
+    # Catalog too large (or caching disabled): stamp what was just loaded
+    return compute_catalog_version(products)
+
+
+def get_all_products():
+    """All products ordered by name"""
+    _check_shared_version()
+    hit, products = _cache.get(ALL_PRODUCTS)
+    if hit:
+        return list(products)
+
+    # Only one thread reloads an expired catalog; the rest wait for its result
+    with _load_lock:
+        hit, products = _cache.get(ALL_PRODUCTS)
+        if hit:
+            return list(products)
+
+        rows = read_query(
+            'SELECT id, name, description, price FROM products ORDER BY name'
+        )
+        products = tuple(Product.from_db_row(row) for row in rows or ())
+
+        if len(products) < _cache.max_size - 1:
+            _cache.set(CATALOG_VERSION, compute_catalog_version(products))
+            _cache.set(ALL_PRODUCTS, products)
+            for product in products:
+                _cache.set(product.id, product)
+
+    return list(products)
+
+
+PRODUCTS_BY_IDS = register_statement(
+    'catalog_products_by_ids',
+    'SELECT id, name, description, price FROM products WHERE id = ANY(%s::int[])'
+)
+
+
+def get_products_by_ids(ids):
+    """Fetch several products keyed by product id, querying only cache misses in one batch"""
+    _check_shared_version()
+    products_by_id = {}
+    missing = []
+    for product_id in sorted({int(product_id) for product_id in ids}):
+        hit, product = _cache.get(product_id)
+        if hit:
+            products_by_id[product_id] = product
+        else:
+            missing.append(product_id)
+
+    if missing:
+        rows = read_prepared(PRODUCTS_BY_IDS, (missing,))
+        for row in rows:
+            product = Product.from_db_row(row)
+            _cache.set(product.id, product)
+            products_by_id[product.id] = product
+
+    return products_by_id
@@ -0,0 +1,207 @@
+"""
+Bulk catalog and inventory import for the Bagel Store application.
+
+CSV files are streamed into temporary staging tables with ``COPY FROM STDIN``
+and merged into ``products`` and ``inventory`` with one set-based upsert per
+table, all in a single transaction: either the whole file applies or nothing
+does. Thousands of rows take a handful of statements instead of one INSERT or
+UPDATE each.
+
+Products CSV: ``id`` plus any of ``name``, ``description``, ``price`` (new
+products need ``name`` and ``price``). Inventory CSV: ``product_id``,
+``quantity``. When a file repeats a key, its last row wins.
+
+The import retries on deadlocks and serialization failures like checkout
+does, reading the files again from the start; input that cannot seek (a
+pipe) is spooled to a temporary file first.
+"""
+
+import csv
+import shutil
+import tempfile
+
+import psycopg2
+
+from catalog import bump_catalog_version, invalidate_catalog
+from database import run_in_transaction
+
+PRODUCT_COLUMNS = ('id', 'name', 'description', 'price')
+INVENTORY_COLUMNS = ('product_id', 'quantity')
+
+# set: the file holds absolute stock counts; add: quantities are added to current stock
+INVENTORY_MODES = ('set', 'add')
+
+
+class CatalogImportError(ValueError):
+    """Raised when an import file is malformed or would violate a constraint"""
+
+
+def _read_header(file, allowed, required):
+    """Consume and validate the CSV header line; returns its column names"""
+    line = file.readline()
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig')
+    columns = [column.strip().lower() for column in next(csv.reader([line]), [])]
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise CatalogImportError('Unknown column(s): %s (expected %s)' % (', '.join(unknown), ', '.join(allowed)))
+    missing = [column for column in required if column not in columns]
+    if missing:
+        raise CatalogImportError('Missing column(s): %s' % ', '.join(missing))
+    if len(set(columns)) != len(columns):
+        raise CatalogImportError('Duplicate column names in header')
+    return columns
+
+
+def _copy_products(cursor, file):
+    columns = _read_header(file, PRODUCT_COLUMNS, ('id',))
+    if len(columns) < 2:
+        raise CatalogImportError('Products file needs at least one of name, description, price')
+    cursor.execute(
+        '''CREATE TEMP TABLE product_import (
+               line BIGINT GENERATED ALWAYS AS IDENTITY,
+               id INTEGER NOT NULL,
+               name VARCHAR(100),
+               description TEXT,
+               price DECIMAL(10, 2) CHECK (price >= 0)
+           ) ON COMMIT DROP'''
+    )
+    cursor.copy_expert(f"COPY product_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", file)
+    return columns
+
+
+def _merge_products(cursor, columns):
+    """Upsert staged products; returns the number of products inserted or changed"""
+    # Column names come from the PRODUCT_COLUMNS whitelist, never from the file verbatim
+    values = [column for column in columns if column != 'id']
+    # NOT NULL is checked before ON CONFLICT, so columns missing from the file
+    # carry the existing product's values (and stay NULL, failing, for new ones)
+    kept = [column for column in PRODUCT_COLUMNS if column not in columns]
+    assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in values)
+    changed = ' OR '.join(f'products.{column} IS DISTINCT FROM EXCLUDED.{column}' for column in values)
+    selected = ', '.join([f'latest.{column}' for column in values] + [f'current.{column}' for column in kept])
+    cursor.execute(
+        f'''INSERT INTO products (id, {', '.join(values + kept)})
+            SELECT latest.id, {selected} FROM (
+                SELECT DISTINCT ON (id) * FROM product_import ORDER BY id, line DESC
+            ) AS latest
+            LEFT JOIN products AS current ON current.id = latest.id
+            ORDER BY latest.id
+            ON CONFLICT (id) DO UPDATE SET {assignments} WHERE {changed}'''
+    )
+    merged = cursor.rowcount
+
+    # New products get an empty stock row, and the id sequence moves past explicit ids
+    cursor.execute(
+        '''INSERT INTO inventory (product_id, quantity)
+           SELECT DISTINCT id, 0 FROM product_import ORDER BY id
+           ON CONFLICT (product_id) DO NOTHING'''
+    )
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence('products', 'id'), GREATEST((SELECT MAX(id) FROM products), 1))"
+    )
+    return merged
+
+
+def _copy_inventory(cursor, file):
+    columns = _read_header(file, INVENTORY_COLUMNS, INVENTORY_COLUMNS)
+    cursor.execute(
+        '''CREATE TEMP TABLE inventory_import (
+               line BIGINT GENERATED ALWAYS AS IDENTITY,
+               product_id INTEGER NOT NULL,
+               quantity INTEGER NOT NULL
+           ) ON COMMIT DROP'''
+    )
+    cursor.copy_expert(f"COPY inventory_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", file)
+
+
+def _merge_inventory(cursor, mode):
+    """Apply staged stock levels; returns the number of products updated.
+
+    Base rows and then stripes are written in (product_id, stripe) order,
+    the order checkout locks them in, so an import and a checkout queue
+    instead of deadlocking. In ``set`` mode the file's count replaces the
+    product's total stock, so any stripes of an imported product are
+    emptied into the base row.
+    """
+    if mode == 'set':
+        update = 'quantity = EXCLUDED.quantity'
+    else:
+        update = 'quantity = inventory.quantity + EXCLUDED.quantity'
+
+    cursor.execute(
+        f'''INSERT INTO inventory (product_id, quantity, last_updated)
+            SELECT product_id, quantity, NOW() FROM (
+                SELECT DISTINCT ON (product_id) product_id, quantity
+                FROM inventory_import
+                ORDER BY product_id, line DESC
+            ) AS latest
+            ORDER BY product_id
+            ON CONFLICT (product_id) DO UPDATE SET {update}, last_updated = NOW()'''
+    )
+    merged = cursor.rowcount
+
+    if mode == 'set':
+        cursor.execute(
+            '''WITH locked AS (
+                   SELECT product_id, stripe FROM inventory_stripes
+                   WHERE product_id IN (SELECT product_id FROM inventory_import) AND quantity <> 0
+                   ORDER BY product_id, stripe
+                   FOR UPDATE
+               )
+               UPDATE inventory_stripes AS st SET quantity = 0, last_updated = NOW()
+               FROM locked
+               WHERE st.product_id = locked.product_id AND st.stripe = locked.stripe'''
+        )
+    return merged
+
+
+def _rewindable(file):
+    """``file`` and its current position, spooled to a temporary file if it cannot seek"""
+    if file is None:
+        return None, 0
+    if file.seekable():
+        return file, file.tell()
+    spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    shutil.copyfileobj(file, spooled)
+    spooled.seek(0)
+    return spooled, 0
+
+
+def import_catalog(products_file=None, inventory_file=None, inventory_mode='set'):
+    """Load product and/or inventory CSVs (open file objects) in one transaction.
+
+    Returns ``{'products': n, 'inventory': n}`` row counts. A products file
+    bumps the shared catalog version, so every process drops its catalog
+    cache; this one drops it right away. Raises CatalogImportError for bad
+    files or rows; nothing is written in that case.
+    """
+    if inventory_mode not in INVENTORY_MODES:
+        raise CatalogImportError(f'Unknown inventory mode: {inventory_mode!r}')
+    if products_file is None and inventory_file is None:
+        raise CatalogImportError('Nothing to import')
+
+    products_file, products_start = _rewindable(products_file)
+    inventory_file, inventory_start = _rewindable(inventory_file)
+
+    def work(cursor):
+        counts = {'products': 0, 'inventory': 0}
+        # Products first, so an inventory file may stock products added by the same import
+        if products_file is not None:
+            products_file.seek(products_start)
+            columns = _copy_products(cursor, products_file)
+            counts['products'] = _merge_products(cursor, columns)
+            bump_catalog_version(cursor)
+        if inventory_file is not None:
+            inventory_file.seek(inventory_start)
+            _copy_inventory(cursor, inventory_file)
+            counts['inventory'] = _merge_inventory(cursor, inventory_mode)
+        return counts
+
+    try:
+        counts = run_in_transaction(work)
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        raise CatalogImportError(str(e).strip()) from e
+
+    invalidate_catalog()
+    return counts
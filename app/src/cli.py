@@ -0,0 +1,102 @@
+"""
+Flask CLI commands for the Bagel Store application.
+
+Run from ``app/src`` with ``flask --app app <command>``.
+"""
+
+import click
+
+from catalog_import import INVENTORY_MODES, CatalogImportError, import_catalog
+from fulfillment import ORDER_STATUSES, InvalidTransitionError, advance_orders
+from inventory import restripe_inventory
+from outbox import OutboxWorker, drain_outbox
+from reports import drain_sales_outbox, rebuild_sales_rollup
+from sessions import get_session_store
+
+
+@click.command('stripe-inventory')
+@click.argument('stripes', type=click.IntRange(min=0))
+def stripe_inventory_command(stripes):
+    """Spread each product's stock across STRIPES counter rows (0 folds it back)"""
+    count = restripe_inventory(stripes)
+    click.echo(f'Restriped inventory for {count} product(s) into {stripes} stripe(s)')
+
+
+@click.command('drain-outbox')
+@click.option('--once', is_flag=True, help='Apply one batch and exit instead of polling.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None, help='Outbox rows per batch.')
+def drain_outbox_command(once, batch_size):
+    """Apply pending inventory decrements and sales rollup updates from the outboxes"""
+    if once:
+        inventory = drain_outbox(batch_size)
+        sales = drain_sales_outbox(batch_size)
+        click.echo(f'Applied {inventory} inventory and {sales} sales outbox row(s)')
+        return
+
+    click.echo('Draining inventory and sales outboxes (Ctrl+C to stop)')
+    worker = OutboxWorker(batch_size=batch_size)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@click.command('sweep-sessions')
+@click.option('--batch-size', type=click.IntRange(min=1), default=1000, help='Sessions deleted per transaction.')
+def sweep_sessions_command(batch_size):
+    """Delete expired server-side sessions"""
+    store = get_session_store()
+    if store is None:
+        click.echo('SESSION_BACKEND is cookie; nothing to sweep')
+        return
+    removed = store.sweep(batch_size)
+    click.echo(f'Removed {removed} expired session(s)')
+
+
+@click.command('advance-orders')
+@click.argument('from_status', type=click.Choice(ORDER_STATUSES))
+@click.argument('to_status', type=click.Choice(ORDER_STATUSES))
+@click.option('--older-than', type=click.IntRange(min=0), default=0, help='Only orders placed at least this many seconds ago.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=1000, help='Orders moved per transaction.')
+def advance_orders_command(from_status, to_status, older_than, batch_size):
+    """Move orders from FROM_STATUS to TO_STATUS in bulk, oldest first"""
+    try:
+        moved = advance_orders(from_status, to_status, older_than, batch_size)
+    except InvalidTransitionError as e:
+        raise click.BadParameter(str(e), param_hint='TO_STATUS')
+    click.echo(f'Moved {moved} order(s) from {from_status} to {to_status}')
+
+
+@click.command('rebuild-sales-rollup')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First day to rebuild (default: all days).')
+def rebuild_sales_rollup_command(since):
+    """Recompute the daily_sales rollup from orders"""
+    rows = rebuild_sales_rollup(since.date() if since else None)
+    click.echo(f'Wrote {rows} daily sales row(s)')
+
+
+@click.command('import-catalog')
+@click.option('--products', type=click.File('rb'), default=None, help='CSV of id,name,description,price.')
+@click.option('--inventory', type=click.File('rb'), default=None, help='CSV of product_id,quantity.')
+@click.option('--inventory-mode', type=click.Choice(INVENTORY_MODES), default='set', show_default=True,
+              help='Replace stock levels or add to them.')
+def import_catalog_command(products, inventory, inventory_mode):
+    """Bulk-load product and inventory CSVs with COPY in one transaction"""
+    if products is None and inventory is None:
+        raise click.UsageError('Pass --products and/or --inventory')
+    try:
+        counts = import_catalog(products, inventory, inventory_mode)
+    except CatalogImportError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Imported {counts['products']} product(s) and {counts['inventory']} inventory row(s)")
+
+
+def register_commands(app):
+    """Attach CLI commands to the Flask app"""
+    app.cli.add_command(stripe_inventory_command)
+    app.cli.add_command(drain_outbox_command)
+    app.cli.add_command(sweep_sessions_command)
+    app.cli.add_command(advance_orders_command)
+    app.cli.add_command(rebuild_sales_rollup_command)
+    app.cli.add_command(import_catalog_command)
@@ -0,0 +1,183 @@
+"""
+Order fulfillment for the Bagel Store application.
+
+Orders move ``pending -> preparing -> ready -> completed`` and can be
+cancelled until they are ready. Status changes are set-based: one
+``UPDATE ... WHERE id = ANY(...) AND status = ANY(<allowed sources>)`` moves
+any number of orders, skipping those already elsewhere, so concurrent kitchen
+screens cannot move an order backwards. Cancelling returns the order's items
+to stock and queues them to be taken out of the sales rollup in the same
+transaction.
+
+The queue of orders in a status is read with keyset pagination on
+``(status, order_date, id)`` (``idx_orders_status_date_id``), so polling deep
+into a long queue costs the same as reading its first page.
+"""
+
+from datetime import datetime
+
+from database import register_statement, run_in_transaction
+from models import Order
+from pagination import decode_cursor, encode_cursor
+from replicas import read_prepared
+from reports import remove_sales
+
+ORDER_STATUSES = ('pending', 'preparing', 'ready', 'completed', 'cancelled')
+
+# status -> statuses an order in it may move to
+TRANSITIONS = {
+    'pending': ('preparing', 'cancelled'),
+    'preparing': ('ready', 'cancelled'),
+    'ready': ('completed',),
+}
+
+QUEUE_FIRST_PAGE = register_statement(
+    'order_queue_first',
+    '''SELECT id, order_date, total_amount, status FROM orders
+       WHERE status = %s
+       ORDER BY order_date, id
+       LIMIT %s'''
+)
+QUEUE_NEXT_PAGE = register_statement(
+    'order_queue_next',
+    '''SELECT id, order_date, total_amount, status FROM orders
+       WHERE status = %s AND (order_date, id) > (%s::timestamp, %s::int)
+       ORDER BY order_date, id
+       LIMIT %s'''
+)
+QUEUE_ITEMS = register_statement(
+    'order_queue_items',
+    '''SELECT oi.order_id, oi.product_id, p.name, oi.quantity
+       FROM order_items oi
+       JOIN products p ON oi.product_id = p.id
+       WHERE oi.order_id = ANY(%s::int[])
+       ORDER BY oi.order_id, oi.id'''
+)
+
+
+class InvalidTransitionError(ValueError):
+    """Raised for an unknown status or a transition the workflow does not allow"""
+
+
+def source_statuses(to_status, from_status=None):
+    """Statuses an order may be moved to ``to_status`` from, optionally narrowed to ``from_status``"""
+    if to_status not in ORDER_STATUSES:
+        raise InvalidTransitionError(f'Unknown order status: {to_status!r}')
+    sources = [status for status, targets in TRANSITIONS.items() if to_status in targets]
+    if from_status is not None:
+        if from_status not in sources:
+            raise InvalidTransitionError(f'Orders cannot move from {from_status!r} to {to_status!r}')
+        sources = [from_status]
+    if not sources:
+        raise InvalidTransitionError(f'No order can move to {to_status!r}')
+    return sources
+
+
+def _restock(cursor, order_ids):
+    """Return the items of cancelled orders to the base inventory rows"""
+    cursor.execute(
+        '''UPDATE inventory AS inv
+           SET quantity = inv.quantity + s.quantity, last_updated = NOW()
+           FROM (
+               SELECT product_id, SUM(quantity) AS quantity FROM order_items
+               WHERE order_id = ANY(%s::int[])
+               GROUP BY product_id
+           ) AS s
+           WHERE inv.product_id = s.product_id''',
+        (order_ids,)
+    )
+
+
+def transition_orders(order_ids, to_status, from_status=None):
+    """Move orders to ``to_status`` in one statement.
+
+    Returns ``(updated, skipped)`` id lists; orders that do not exist or are
+    not in an allowed source status are skipped.
+    """
+    sources = source_statuses(to_status, from_status)
+    ids = sorted({int(order_id) for order_id in order_ids})
+    if not ids:
+        return [], []
+
+    def work(cursor):
+        cursor.execute(
+            '''UPDATE orders SET status = %s
+               WHERE id = ANY(%s::int[]) AND status = ANY(%s::text[])
+               RETURNING id''',
+            (to_status, ids, sources)
+        )
+        updated = sorted(row[0] for row in cursor.fetchall())
+        if to_status == 'cancelled' and updated:
+            _restock(cursor, updated)
+            remove_sales(cursor, updated)
+        return updated
+
+    updated = run_in_transaction(work)
+    updated_ids = set(updated)
+    return updated, [order_id for order_id in ids if order_id not in updated_ids]
+
+
+def advance_orders(from_status, to_status, older_than=0, batch_size=1000):
+    """Move every order in ``from_status`` placed at least ``older_than`` seconds ago.
+
+    Works oldest first in batches of ``batch_size``, one short transaction
+    each; rows locked by a concurrent transition are skipped. Returns the
+    number of orders moved.
+    """
+    source_statuses(to_status, from_status)
+
+    def work(cursor):
+        cursor.execute(
+            '''UPDATE orders SET status = %s
+               WHERE id IN (
+                   SELECT id FROM orders
+                   WHERE status = %s AND order_date <= NOW() - %s * INTERVAL '1 second'
+                   ORDER BY order_date, id
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING id''',
+            (to_status, from_status, older_than, batch_size)
+        )
+        updated = [row[0] for row in cursor.fetchall()]
+        if to_status == 'cancelled' and updated:
+            _restock(cursor, updated)
+            remove_sales(cursor, updated)
+        return len(updated)
+
+    moved = 0
+    while True:
+        count = run_in_transaction(work)
+        moved += count
+        if count < batch_size:
+            return moved
+
+
+def get_order_queue(status, after=None, limit=50):
+    """One page of orders in ``status``, oldest first, with their items.
+
+    ``after`` is the ``next`` cursor of the previous page. Returns
+    ``(orders, items_by_order_id, next_cursor)``; ``next_cursor`` is None on
+    the last page.
+    """
+    if status not in ORDER_STATUSES:
+        raise InvalidTransitionError(f'Unknown order status: {status!r}')
+
+    # One extra row tells whether another page follows
+    if after is None:
+        rows = read_prepared(QUEUE_FIRST_PAGE, (status, limit + 1))
+    else:
+        order_date, order_id = decode_cursor(after, (datetime.fromisoformat, int))
+        rows = read_prepared(QUEUE_NEXT_PAGE, (status, order_date, order_id, limit + 1))
+
+    orders = [Order.from_db_row(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(orders[-1].order_date, orders[-1].id)
+
+    items_by_order_id = {order.id: [] for order in orders}
+    if orders:
+        for row in read_prepared(QUEUE_ITEMS, (list(items_by_order_id),)):
+            items_by_order_id[row[0]].append({'product_id': row[1], 'product_name': row[2], 'quantity': row[3]})
+
+    return orders, items_by_order_id, next_cursor
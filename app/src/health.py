@@ -0,0 +1,90 @@
+"""
+Health checks for the Bagel Store application.
+
+Liveness never touches the database. Readiness verifies connectivity and the
+schema with a single catalog query and caches the outcome for
+``HEALTH_CACHE_TTL`` seconds, so frequent load balancer probes add almost no
+database load.
+"""
+
+import os
+import threading
+import time
+
+from replicas import get_replicas, read_query
+
+REQUIRED_TABLES = ['products', 'orders', 'order_items', 'inventory']
+
+_cached = None
+_cached_at = 0.0
+_lock = threading.Lock()
+
+
+def check_readiness():
+    """Database and schema status as ``(checks, http_status)``, cached between probes"""
+    global _cached, _cached_at
+    ttl = float(os.environ.get('HEALTH_CACHE_TTL', '5'))
+
+    with _lock:
+        if _cached is not None and time.monotonic() - _cached_at < ttl:
+            return _cached
+
+        _cached = _run_checks()
+        _cached_at = time.monotonic()
+        return _cached
+
+
+def _run_checks():
+    """Check connectivity and required tables with one query"""
+    try:
+        rows = read_query(
+            '''SELECT t.name FROM unnest(%s::text[]) WITH ORDINALITY AS t(name, position)
+               WHERE to_regclass('public.' || t.name) IS NOT NULL
+               ORDER BY t.position''',
+            (REQUIRED_TABLES,)
+        )
+    except Exception as e:
+        return readiness_failure(e)
+    checks, status_code = readiness_result([row[0] for row in rows])
+
+    replicas = get_replicas()
+    if replicas.replicas:
+        # A replica that is down only costs read offloading, not readiness
+        checks['replicas'] = replicas.status()
+    return checks, status_code
+
+
+def readiness_failure(error):
+    """Readiness response when the database cannot be queried"""
+    return {
+        'status': 'unhealthy',
+        'database': 'disconnected',
+        'schema': 'unknown',
+        'tables': [],
+        'error': str(error)
+    }, 500
+
+
+def readiness_result(existing_tables):
+    """Readiness response for the required tables found in the database"""
+    checks = {
+        'status': 'healthy',
+        'database': 'connected',
+        'schema': 'unknown',
+        'tables': existing_tables
+    }
+
+    # Determine overall schema status
+    if len(existing_tables) == len(REQUIRED_TABLES):
+        checks['schema'] = 'complete'
+        return checks, 200
+    elif len(existing_tables) > 0:
+        checks['schema'] = 'partial'
+        checks['status'] = 'degraded'
+        checks['missing_tables'] = [table for table in REQUIRED_TABLES if table not in existing_tables]
+        return checks, 503  # Service Unavailable
+    else:
+        checks['schema'] = 'missing'
+        checks['status'] = 'unhealthy'
+        checks['error'] = 'Database schema not initialized'
+        return checks, 500  # Internal Server Error
@@ -0,0 +1,243 @@
+"""
+Inventory reservation for the Bagel Store application.
+
+Stock for a product is ``inventory.quantity`` plus the sum of its rows in
+``inventory_stripes``. With ``INVENTORY_STRIPES`` unset (or 0) stripes are
+empty and every checkout locks the single ``inventory`` row. Setting it to N
+and running ``flask stripe-inventory N`` spreads stock across N stripe rows,
+so concurrent checkouts for the same product decrement different rows.
+
+Stock left in stripes is still sold after ``INVENTORY_STRIPES`` is lowered to
+0: a checkout that finds a base row short goes on to the stripes. Fold them
+back with ``flask stripe-inventory 0`` so checkouts lock one row again.
+"""
+
+import os
+
+from psycopg2.extras import execute_values
+
+from database import execute_prepared, register_statement, run_in_transaction
+
+
+class InsufficientStockError(Exception):
+    """Raised when a reservation would drive stock below zero"""
+
+    def __init__(self, shortages):
+        # {product_id: (requested, available)}
+        self.shortages = shortages
+        super().__init__(
+            'Insufficient stock for product(s) %s' % ', '.join(str(product_id) for product_id in sorted(shortages))
+        )
+
+
+LOCK_INVENTORY_ROWS = register_statement(
+    'inventory_lock_rows',
+    '''SELECT product_id, quantity FROM inventory
+       WHERE product_id = ANY(%s::int[])
+       ORDER BY product_id
+       FOR UPDATE'''
+)
+DECREMENT_INVENTORY = register_statement(
+    'inventory_decrement',
+    '''UPDATE inventory AS inv
+       SET quantity = inv.quantity - v.quantity, last_updated = NOW()
+       FROM unnest(%s::int[], %s::int[]) AS v(product_id, quantity)
+       WHERE inv.product_id = v.product_id'''
+)
+
+
+def get_stripe_count():
+    """Number of stock stripes per product; 0 disables striping"""
+    return int(os.environ.get('INVENTORY_STRIPES', '0'))
+
+
+def reserve_inventory(cursor, quantities, allow_shortfall=False):
+    """Decrement stock for ``{product_id: quantity}`` inside the caller's transaction.
+
+    Nothing is written if any product is short, unless ``allow_shortfall``
+    is set (for orders already accepted, e.g. from the outbox): then stock is
+    taken wherever it is and the base row covers the rest, going negative.
+    Returns the ``{product_id: (requested, available)}`` shortfalls.
+    """
+    if get_stripe_count() > 0:
+        return _reserve_striped(cursor, quantities, allow_shortfall)
+    return _reserve_rows(cursor, quantities, allow_shortfall)
+
+
+def _reserve_rows(cursor, quantities, allow_shortfall=False):
+    """Reserve against the single inventory row per product.
+
+    Rows are locked in ascending product_id order so concurrent checkouts
+    over overlapping carts queue behind each other instead of deadlocking.
+    A product short on its base row is looked for in the stripes as well.
+    """
+    product_ids = sorted(quantities)
+    execute_prepared(cursor, LOCK_INVENTORY_ROWS, (product_ids,))
+    available = {row[0]: row[1] for row in cursor.fetchall()}
+
+    shortages = {
+        product_id: (quantities[product_id], available.get(product_id, 0))
+        for product_id in product_ids
+        if available.get(product_id, 0) < quantities[product_id]
+    }
+    if shortages:
+        # Stripes left over from an earlier INVENTORY_STRIPES setting may hold
+        # the rest; the base rows are locked already, so stripes come next
+        return _draw_across_stripes(cursor, quantities, allow_shortfall)
+
+    execute_prepared(
+        cursor,
+        DECREMENT_INVENTORY,
+        (product_ids, [quantities[product_id] for product_id in product_ids])
+    )
+    return shortages
+
+
+def _reserve_striped(cursor, quantities, allow_shortfall=False):
+    """Reserve against striped counters.
+
+    Fast path: one statement picks a random unlocked stripe with enough stock
+    for every product (SKIP LOCKED, so it never waits on a busy stripe) and
+    decrements it. If any product could not be placed, the fast path is
+    rolled back to a savepoint, releasing its stripe locks before anything
+    blocks, and the whole cart is drawn across base rows and stripes instead.
+    """
+    product_ids = sorted(quantities)
+    cursor.execute('SAVEPOINT reserve_striped')
+    cursor.execute(
+        '''WITH wanted AS (
+               SELECT product_id, quantity FROM unnest(%s::int[], %s::int[]) AS w(product_id, quantity)
+           ),
+           picked AS (
+               SELECT w.product_id, s.stripe, w.quantity
+               FROM wanted w
+               CROSS JOIN LATERAL (
+                   SELECT stripe FROM inventory_stripes st
+                   WHERE st.product_id = w.product_id AND st.quantity >= w.quantity
+                   ORDER BY random()
+                   LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+               ) s
+           )
+           UPDATE inventory_stripes AS st
+           SET quantity = st.quantity - p.quantity, last_updated = NOW()
+           FROM picked p
+           WHERE st.product_id = p.product_id AND st.stripe = p.stripe
+           RETURNING st.product_id''',
+        (product_ids, [quantities[product_id] for product_id in product_ids])
+    )
+    placed = {row[0] for row in cursor.fetchall()}
+    if len(placed) < len(product_ids):
+        cursor.execute('ROLLBACK TO SAVEPOINT reserve_striped')
+    cursor.execute('RELEASE SAVEPOINT reserve_striped')
+
+    if len(placed) < len(product_ids):
+        return _draw_across_stripes(cursor, quantities, allow_shortfall)
+    return {}
+
+
+def _draw_across_stripes(cursor, quantities, allow_shortfall=False):
+    """Take ``{product_id: quantity}`` from the base rows and stripes of each product.
+
+    Base rows and then stripes are locked in (product_id, stripe) order, the
+    order every blocking reservation waits in, so concurrent checkouts queue
+    instead of deadlocking. Raises InsufficientStockError if any product is
+    short (unless ``allow_shortfall``); nothing is written in that case.
+    """
+    product_ids = sorted(quantities)
+    execute_prepared(cursor, LOCK_INVENTORY_ROWS, (product_ids,))
+    base = {row[0]: row[1] for row in cursor.fetchall()}
+
+    cursor.execute(
+        '''SELECT product_id, stripe, quantity FROM inventory_stripes
+           WHERE product_id = ANY(%s::int[])
+           ORDER BY product_id, stripe
+           FOR UPDATE''',
+        (product_ids,)
+    )
+    stripes = {}
+    for product_id, stripe, quantity in cursor.fetchall():
+        stripes.setdefault(product_id, []).append((stripe, quantity))
+
+    shortages = {}
+    for product_id in product_ids:
+        available = base.get(product_id, 0) + sum(quantity for stripe, quantity in stripes.get(product_id, ()))
+        if available < quantities[product_id]:
+            shortages[product_id] = (quantities[product_id], available)
+    if shortages and not allow_shortfall:
+        raise InsufficientStockError(shortages)
+
+    base_takes = []
+    draws = []
+    for product_id in product_ids:
+        base_take = min(max(base.get(product_id, 0), 0), quantities[product_id])
+        remaining = quantities[product_id] - base_take
+        for stripe, quantity in stripes.get(product_id, ()):
+            if remaining == 0:
+                break
+            take = min(quantity, remaining)
+            if take > 0:
+                draws.append((product_id, stripe, take))
+                remaining -= take
+        # Only with allow_shortfall: whatever the stripes could not cover comes off the base row
+        base_takes.append(base_take + remaining)
+
+    execute_prepared(cursor, DECREMENT_INVENTORY, (product_ids, base_takes))
+    if draws:
+        cursor.execute(
+            '''UPDATE inventory_stripes AS st
+               SET quantity = st.quantity - v.quantity, last_updated = NOW()
+               FROM unnest(%s::int[], %s::int[], %s::int[]) AS v(product_id, stripe, quantity)
+               WHERE st.product_id = v.product_id AND st.stripe = v.stripe''',
+            tuple(list(column) for column in zip(*draws))
+        )
+    return shortages
+
+
+def restripe_inventory(stripes):
+    """Redistribute each product's stock evenly across ``stripes`` stripe rows.
+
+    ``stripes=0`` folds all stock back into the base ``inventory`` row. Run
+    this after changing ``INVENTORY_STRIPES``.
+    """
+    def work(cursor):
+        cursor.execute(
+            'SELECT product_id, quantity FROM inventory ORDER BY product_id FOR UPDATE'
+        )
+        base = {row[0]: row[1] for row in cursor.fetchall()}
+
+        cursor.execute(
+            '''SELECT product_id, SUM(quantity) FROM inventory_stripes
+               GROUP BY product_id'''
+        )
+        striped = {row[0]: row[1] for row in cursor.fetchall()}
+
+        cursor.execute('DELETE FROM inventory_stripes')
+        if not base:
+            return 0
+
+        totals = {product_id: quantity + striped.get(product_id, 0) for product_id, quantity in base.items()}
+        if stripes > 0:
+            stripe_rows = []
+            for product_id, total in totals.items():
+                share, extra = divmod(total, stripes)
+                for stripe in range(stripes):
+                    stripe_rows.append((product_id, stripe, share + (1 if stripe < extra else 0)))
+            execute_values(
+                cursor,
+                'INSERT INTO inventory_stripes (product_id, stripe, quantity) VALUES %s',
+                stripe_rows
+            )
+
+        execute_values(
+            cursor,
+            '''UPDATE inventory AS inv
+               SET quantity = v.quantity, last_updated = NOW()
+               FROM (VALUES %s) AS v(product_id, quantity)
+               WHERE inv.product_id = v.product_id''',
+            [(product_id, 0 if stripes > 0 else total) for product_id, total in totals.items()],
+            page_size=len(totals)
+        )
+        return len(totals)
+
+    return run_in_transaction(work)
@@ -0,0 +1,222 @@
+"""
+Prometheus metrics for the Bagel Store application.
+
+``/metrics`` serves the text exposition format: request latency histograms
+per blueprint route, in-flight requests, exceptions, order placement
+outcomes, connection pool occupancy, catalog cache counters and the database
+totals from ``query_stats``.
+
+Request and order counters are kept per thread: each thread owns a shard it
+updates without locking, and a scrape sums every shard. Recording a request
+is a bucket search and a few integer increments on preallocated lists.
+
+Every series carries a ``worker`` label with the process id. A scrape is
+answered by whichever Gunicorn worker accepts it, so without the label the
+counters of different processes would be reported as one series that jumps
+up and down; aggregate with ``sum without (worker) (...)``.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ORDER_OUTCOMES = ('placed', 'insufficient_stock', 'failed')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Shard:
+    """Counters owned by a single thread"""
+
+    __slots__ = ('in_flight', 'routes', 'exceptions', 'orders')
+
+    def __init__(self):
+        self.in_flight = 0
+        # endpoint -> [bucket counts (last is +Inf), sum of seconds]
+        self.routes = {}
+        self.exceptions = {}
+        self.orders = dict.fromkeys(ORDER_OUTCOMES, 0)
+
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def record_request(endpoint, seconds, failed=False):
+    """Count one finished request in the calling thread's shard"""
+    shard = _shard()
+    route = shard.routes.get(endpoint)
+    if route is None:
+        route = shard.routes[endpoint] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+    route[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    route[1] += seconds
+    if failed:
+        shard.exceptions[endpoint] = shard.exceptions.get(endpoint, 0) + 1
+
+
+def record_order(outcome):
+    """Count an order placement attempt by outcome (one of ORDER_OUTCOMES)"""
+    _shard().orders[outcome] += 1
+
+
+def _collect():
+    """Sum every thread's shard"""
+    with _shards_lock:
+        shards = list(_shards)
+
+    in_flight = 0
+    routes = {}
+    exceptions = {}
+    orders = dict.fromkeys(ORDER_OUTCOMES, 0)
+    for shard in shards:
+        in_flight += shard.in_flight
+        for endpoint, (counts, seconds) in list(shard.routes.items()):
+            total = routes.setdefault(endpoint, [[0] * len(counts), 0.0])
+            total[0] = [a + b for a, b in zip(total[0], counts)]
+            total[1] += seconds
+        for endpoint, count in list(shard.exceptions.items()):
+            exceptions[endpoint] = exceptions.get(endpoint, 0) + count
+        for outcome, count in shard.orders.items():
+            orders[outcome] += count
+    return in_flight, routes, exceptions, orders
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    """Label set for a sample of this process, ``worker`` first"""
+    labels = {'worker': os.getpid(), **labels}
+    return ','.join(f'{key}="{_label(val)}"' for key, val in labels.items())
+
+
+def _metric(lines, name, kind, help_text, samples):
+    """Append one metric family; ``samples`` is a list of ``(labels, value)``"""
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{name}{{{_labels(**labels)}}} {value}')
+
+
+def render_metrics(async_pool=None):
+    """All metrics in the Prometheus text exposition format
+
+    ``async_pool`` is the ASGI storefront's asyncpg pool, reported next to the
+    psycopg2 pool that checkout uses.
+    """
+    from catalog import get_catalog_cache
+    from database import get_pool
+    from query_stats import get_query_totals
+    from replicas import get_replicas
+
+    in_flight, routes, exceptions, orders = _collect()
+    lines = []
+
+    lines.append('# HELP bagel_http_request_duration_seconds Request latency by blueprint route')
+    lines.append('# TYPE bagel_http_request_duration_seconds histogram')
+    for endpoint in sorted(routes):
+        counts, seconds = routes[endpoint]
+        label = _labels(endpoint=endpoint)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+            cumulative += count
+            lines.append(f'bagel_http_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'bagel_http_request_duration_seconds_sum{{{label}}} {seconds}')
+        lines.append(f'bagel_http_request_duration_seconds_count{{{label}}} {cumulative}')
+
+    _metric(lines, 'bagel_http_requests_in_flight', 'gauge', 'Requests currently being handled',
+            [({}, in_flight)])
+    _metric(lines, 'bagel_http_request_exceptions_total', 'counter', 'Requests that raised an unhandled exception',
+            [({'endpoint': endpoint}, count) for endpoint, count in sorted(exceptions.items())])
+    _metric(lines, 'bagel_orders_total', 'counter', 'Order placement attempts by outcome',
+            [({'outcome': outcome}, count) for outcome, count in orders.items()])
+
+    pool = get_pool().stats()
+    _metric(lines, 'bagel_db_pool_connections', 'gauge', 'Pooled database connections by state',
+            [({'state': 'idle'}, pool['idle']), ({'state': 'in_use'}, pool['in_use'])])
+    _metric(lines, 'bagel_db_pool_max_connections', 'gauge', 'Connection pool size limit',
+            [({}, pool['max_size'])])
+    if async_pool is not None:
+        idle = async_pool.get_idle_size()
+        _metric(lines, 'bagel_db_async_pool_connections', 'gauge', 'asyncpg pool connections by state',
+                [({'state': 'idle'}, idle), ({'state': 'in_use'}, async_pool.get_size() - idle)])
+        _metric(lines, 'bagel_db_async_pool_max_connections', 'gauge', 'asyncpg pool size limit',
+                [({}, async_pool.get_max_size())])
+
+    _metric(lines, 'bagel_db_replica_up', 'gauge', 'Whether a read replica is in rotation (1) or failed over (0)',
+            [({'replica': replica['name']}, int(replica['healthy'])) for replica in get_replicas().status()])
+
+    db = get_query_totals()
+    _metric(lines, 'bagel_db_queries_total', 'counter', 'Statements executed by requests',
+            [({}, db['queries'])])
+    _metric(lines, 'bagel_db_query_seconds_total', 'counter', 'Time requests spent executing statements',
+            [({}, db['db_time'])])
+    _metric(lines, 'bagel_db_acquire_seconds_total', 'counter', 'Time requests spent waiting for a pooled connection',
+            [({}, db['acquire_time'])])
+
+    cache = get_catalog_cache().stats()
+    _metric(lines, 'bagel_catalog_cache_hits_total', 'counter', 'Catalog cache hits', [({}, cache['hits'])])
+    _metric(lines, 'bagel_catalog_cache_misses_total', 'counter', 'Catalog cache misses', [({}, cache['misses'])])
+    _metric(lines, 'bagel_catalog_cache_hit_ratio', 'gauge', 'Catalog cache hits / lookups', [({}, cache['hit_ratio'])])
+    _metric(lines, 'bagel_catalog_cache_entries', 'gauge', 'Entries in the catalog cache', [({}, cache['size'])])
+
+    return '\n'.join(lines) + '\n'
+
+
+def _start_request(g):
+    _shard().in_flight += 1
+    g._metrics_started = time.perf_counter()
+
+
+def _finish_request(g, endpoint, exc):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return
+    _shard().in_flight -= 1
+    record_request(endpoint or 'unmatched', time.perf_counter() - started, failed=exc is not None)
+
+
+def init_app(app):
+    """Time every request and track in-flight requests"""
+
+    @app.before_request
+    def start_request_timer():
+        _start_request(g)
+
+    @app.teardown_request
+    def stop_request_timer(exc=None):
+        _finish_request(g, request.endpoint, exc)
+
+
+def init_asgi_app(app):
+    """The same request timing for the Quart storefront
+
+    The hooks are coroutines so they run on the event loop thread; Quart would
+    hand plain functions to its executor.
+    """
+    from quart import g as quart_g, request as quart_request
+
+    @app.before_request
+    async def start_request_timer():
+        _start_request(quart_g)
+
+    @app.teardown_request
+    async def stop_request_timer(exc=None):
+        _finish_request(quart_g, quart_request.endpoint, exc)
@@ -1,83 +1,84 @@
 """
 Database models for the Bagel Store application.
+
+Models are frozen slotted dataclasses: no per-instance ``__dict__``, and a
+cached Product can be shared between requests without being modified.
+``from_db_row`` maps a row (a psycopg2 tuple or an asyncpg Record) by
+position; money columns stay ``Decimal`` exactly as the driver returns them.
 """
 
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from decimal import Decimal
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Product:
     """Bagel product model"""
     id: int
     name: str
     description: str
-    price: float
+    price: Decimal
 
-    @staticmethod
-    def from_db_row(row):
+    @classmethod
+    def from_db_row(cls, row):
         """Create Product from database row"""
-        return Product(
-            id=row[0],
-            name=row[1],
-            description=row[2],
-            price=float(row[3])
-        )
+        return cls(row[0], row[1], row[2], row[3])
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Inventory:
     """Inventory tracking model"""
     product_id: int
     quantity: int
     last_updated: datetime
 
-    @staticmethod
-    def from_db_row(row):
+    @classmethod
+    def from_db_row(cls, row):
         """Create Inventory from database row"""
-        return Inventory(
-            product_id=row[0],
-            quantity=row[1],
-            last_updated=row[2]
-        )
+        return cls(row[0], row[1], row[2])
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Order:
     """Customer order model"""
     id: int
     order_date: datetime
-    total_amount: float
+    total_amount: Decimal
     status: str
 
-    @staticmethod
-    def from_db_row(row):
+    @classmethod
+    def from_db_row(cls, row):
         """Create Order from database row"""
-        return Order(
-            id=row[0],
-            order_date=row[1],
-            total_amount=float(row[2]),
-            status=row[3]
-        )
+        return cls(row[0], row[1], row[2], row[3])
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class OrderItem:
     """Order line item model"""
     id: int
     order_id: int
     product_id: int
     quantity: int
-    price: float
+    price: Decimal
 
-    @staticmethod
-    def from_db_row(row):
+    @classmethod
+    def from_db_row(cls, row):
         """Create OrderItem from database row"""
-        return OrderItem(
-            id=row[0],
-            order_id=row[1],
-            product_id=row[2],
-            quantity=row[3],
-            price=float(row[4])
-        )
+        return cls(row[0], row[1], row[2], row[3], row[4])
+
+
+@dataclass(frozen=True, slots=True)
+class DailySales:
+    """Sales rollup for one product on one day"""
+    sales_date: date
+    product_id: int
+    product_name: str
+    order_count: int
+    quantity: int
+    revenue: Decimal
+
+    @classmethod
+    def from_db_row(cls, row):
+        """Create DailySales from database row"""
+        return cls(row[0], row[1], row[2], row[3], row[4], row[5])
@@ -0,0 +1,89 @@
+"""
+Order placement for the Bagel Store application.
+"""
+
+from cart import parse_quantity
+from database import execute_prepared, register_statement, run_in_transaction
+from inventory import InsufficientStockError, reserve_inventory
+from metrics import record_order
+from outbox import enqueue_inventory_delta, is_async_inventory
+from reports import record_sales
+
+
+PRODUCT_PRICES = register_statement(
+    'order_product_prices',
+    'SELECT id, price FROM products WHERE id = ANY(%s::int[]) ORDER BY id'
+)
+
+
+def aggregate_cart(cart_items):
+    """Collapse session cart entries into ``{product_id: quantity}``.
+
+    Raises InvalidQuantityError for an entry below 1, which would otherwise
+    add stock back instead of reserving it.
+    """
+    quantities = {}
+    for item in cart_items:
+        product_id = int(item['product_id'])
+        quantities[product_id] = quantities.get(product_id, 0) + parse_quantity(item['quantity'])
+    return quantities
+
+
+def create_order(cart_items):
+    """Create an order, its line items, the inventory decrement and its sales outbox row in one transaction.
+
+    Every statement is set-based, so the number of round trips does not grow
+    with the size of the cart. Returns the new order id, or None when no cart
+    entry refers to an existing product. Raises InsufficientStockError when
+    stock cannot cover the cart and InvalidQuantityError for a quantity below
+    1; nothing is written in either case.
+    """
+    quantities = aggregate_cart(cart_items)
+    if not quantities:
+        return None
+
+    def work(cursor):
+        # Price from the database, not the catalog cache, so orders never use stale prices
+        execute_prepared(cursor, PRODUCT_PRICES, (sorted(quantities),))
+        prices = {row[0]: row[1] for row in cursor.fetchall()}
+        if not prices:
+            return None
+
+        product_ids = list(prices)
+        item_quantities = [quantities[product_id] for product_id in product_ids]
+        item_prices = [prices[product_id] for product_id in product_ids]
+        total = sum(price * quantity for price, quantity in zip(item_prices, item_quantities))
+
+        cursor.execute(
+            'INSERT INTO orders (order_date, total_amount, status) VALUES (NOW(), %s, %s) RETURNING id',
+            (total, 'pending')
+        )
+        order_id = cursor.fetchone()[0]
+
+        cursor.execute(
+            '''INSERT INTO order_items (order_id, product_id, quantity, price)
+               SELECT %s, i.product_id, i.quantity, i.price
+               FROM unnest(%s::int[], %s::int[], %s::numeric[]) AS i(product_id, quantity, price)''',
+            (order_id, product_ids, item_quantities, item_prices)
+        )
+
+        item_deltas = dict(zip(product_ids, item_quantities))
+        if is_async_inventory():
+            enqueue_inventory_delta(cursor, order_id, item_deltas)
+        else:
+            # Inventory rows are locked late so they are held only until commit
+            reserve_inventory(cursor, item_deltas)
+
+        record_sales(cursor, order_id)
+        return order_id
+
+    try:
+        order_id = run_in_transaction(work)
+    except InsufficientStockError:
+        record_order('insufficient_stock')
+        raise
+    except Exception:
+        record_order('failed')
+        raise
+    record_order('placed' if order_id is not None else 'failed')
+    return order_id
@@ -0,0 +1,159 @@
+"""
+Asynchronous inventory updates through an outbox table.
+
+With ``INVENTORY_ASYNC=true`` checkout records the order and one
+``inventory_outbox`` row per line item in a single short transaction instead
+of updating ``inventory``. A background worker drains the outbox in batches,
+folding every pending row for a product into a single UPDATE. The same
+worker folds ``sales_outbox`` into the daily sales rollup, which checkout
+always defers (``reports.drain_sales_outbox``).
+
+The stock check at checkout is advisory in this mode: it subtracts pending
+outbox rows from current stock without locking, so two simultaneous
+checkouts for the last units can both succeed.
+"""
+
+import logging
+import os
+import threading
+
+from database import run_in_transaction
+from inventory import InsufficientStockError, reserve_inventory
+from reports import drain_sales_outbox
+
+logger = logging.getLogger(__name__)
+
+
+def is_async_inventory():
+    """Whether checkout defers inventory updates to the outbox"""
+    return os.environ.get('INVENTORY_ASYNC', 'false').lower() == 'true'
+
+
+def enqueue_inventory_delta(cursor, order_id, quantities):
+    """Record pending decrements for ``{product_id: quantity}`` inside the caller's transaction"""
+    product_ids = sorted(quantities)
+    item_quantities = [quantities[product_id] for product_id in product_ids]
+
+    cursor.execute(
+        '''SELECT i.product_id,
+                  i.quantity
+                  + COALESCE((SELECT SUM(s.quantity) FROM inventory_stripes s WHERE s.product_id = i.product_id), 0)
+                  - COALESCE((SELECT SUM(o.quantity) FROM inventory_outbox o WHERE o.product_id = i.product_id), 0)
+           FROM inventory i
+           WHERE i.product_id = ANY(%s)''',
+        (product_ids,)
+    )
+    available = {row[0]: row[1] for row in cursor.fetchall()}
+    shortages = {
+        product_id: (quantities[product_id], max(available.get(product_id, 0), 0))
+        for product_id in product_ids
+        if available.get(product_id, 0) < quantities[product_id]
+    }
+    if shortages:
+        raise InsufficientStockError(shortages)
+
+    cursor.execute(
+        '''INSERT INTO inventory_outbox (order_id, product_id, quantity)
+           SELECT %s, d.product_id, d.quantity
+           FROM unnest(%s::int[], %s::int[]) AS d(product_id, quantity)''',
+        (order_id, product_ids, item_quantities)
+    )
+
+
+def drain_outbox(batch_size=None):
+    """Apply up to ``batch_size`` pending outbox rows; returns how many were applied.
+
+    Rows are claimed with SKIP LOCKED, so several workers can drain
+    concurrently without applying a row twice. Each batch is applied with
+    ``reserve_inventory``, so stripes are drawn down the same way checkout
+    does it; the orders are already placed, so a shortfall is logged and
+    taken off the base row rather than rejected.
+    """
+    if batch_size is None:
+        batch_size = int(os.environ.get('OUTBOX_BATCH_SIZE', '500'))
+
+    def work(cursor):
+        cursor.execute(
+            '''WITH batch AS (
+                   DELETE FROM inventory_outbox
+                   WHERE id IN (
+                       SELECT id FROM inventory_outbox
+                       ORDER BY id
+                       LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   )
+                   RETURNING product_id, quantity
+               )
+               SELECT product_id, SUM(quantity), COUNT(*) FROM batch GROUP BY product_id''',
+            (batch_size,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        shortfalls = reserve_inventory(cursor, {row[0]: int(row[1]) for row in rows}, allow_shortfall=True)
+        for product_id, (requested, available) in sorted(shortfalls.items()):
+            logger.warning('Outbox oversold product %s: applied %s with %s in stock', product_id, requested, available)
+        return sum(row[2] for row in rows)
+
+    return run_in_transaction(work)
+
+
+class OutboxWorker(threading.Thread):
+    """Daemon thread that drains the inventory and sales outboxes until stopped"""
+
+    def __init__(self, batch_size=None, poll_interval=None):
+        super().__init__(name='outbox', daemon=True)
+        self.batch_size = batch_size or int(os.environ.get('OUTBOX_BATCH_SIZE', '500'))
+        self.poll_interval = poll_interval or float(os.environ.get('OUTBOX_POLL_INTERVAL', '1.0'))
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            applied = 0
+            # One failing outbox must not hold up the other
+            for name, drain in (('inventory', drain_outbox), ('sales', drain_sales_outbox)):
+                try:
+                    applied = max(applied, drain(self.batch_size))
+                except Exception:
+                    logger.exception('Failed to drain %s outbox', name)
+
+            # A full batch means more rows are waiting, so go again immediately
+            if applied < self.batch_size:
+                self._stop_event.wait(self.poll_interval)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def should_start_worker():
+    """Whether a server process should drain the outboxes in a background thread.
+
+    The sales outbox is written by every checkout, so this does not depend on
+    ``INVENTORY_ASYNC``. Only the server entry points ask; CLI processes
+    (``flask drain-outbox``, migrations, imports) never start the thread.
+    """
+    return os.environ.get('OUTBOX_WORKER', 'thread') == 'thread'
+
+
+def start_outbox_worker():
+    """Start the in-process outbox worker once per process"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker()
+            _worker.start()
+        return _worker
+
+
+def stop_outbox_worker():
+    """Stop the in-process outbox worker, if running"""
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop()
+            _worker.join(timeout=5)
+            _worker = None
@@ -0,0 +1,50 @@
+"""
+Keyset pagination helpers for the Bagel Store application.
+
+A page ends with an opaque ``next`` cursor encoding the sort key of its last
+row. The following page resumes with ``WHERE (key) > (cursor values)``, which
+an index range scan answers directly, instead of reading and discarding
+``OFFSET`` rows that grow with every page.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(*values):
+    """Opaque, URL-safe cursor for a row's sort key"""
+    payload = [
+        value.isoformat() if isinstance(value, (date, datetime)) else str(value) if isinstance(value, Decimal) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, types):
+    """Sort key values from a cursor, converted with ``types`` (e.g. ``(datetime.fromisoformat, int)``)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError('wrong number of values')
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursorError(f'Invalid pagination cursor: {token!r}') from e
+
+
+def get_page_limit(value, default=50, maximum=500):
+    """Page size from a query string value, clamped to ``1..maximum``"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidCursorError(f'Invalid page size: {value!r}') from None
+    return max(1, min(limit, maximum))
@@ -0,0 +1,227 @@
+"""
+Process-wide PostgreSQL connection pool.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolExhaustedError(PoolError):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class _PooledConnection:
+    """Bookkeeping for a connection owned by the pool"""
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Thread-safe connection pool with idle timeout, max lifetime and checkout validation.
+
+    ``timeout`` controls exhaustion behaviour: a positive value blocks for up
+    to that many seconds waiting for a connection to be returned, ``0`` fails
+    fast with ``PoolExhaustedError``.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, idle_timeout=300.0,
+                 max_lifetime=1800.0, timeout=5.0, validate=True,
+                 validate_interval=5.0, **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Invalid pool size: min_size=%s, max_size=%s' % (min_size, max_size))
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.validate = validate
+        self.validate_interval = validate_interval
+        self.connect_kwargs = connect_kwargs
+
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._in_use = {}
+        self._opening = 0
+        # Connections between lists while they are validated or rolled back
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+    @property
+    def size(self):
+        """Number of open connections (idle + checked out + being opened or checked)"""
+        return len(self._idle) + len(self._in_use) + self._opening + self._pending
+
+    def stats(self):
+        """Snapshot of pool occupancy"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+    def warm(self):
+        """Open connections until the pool holds at least ``min_size``"""
+        while True:
+            with self._cond:
+                if self._closed or self.size >= self.min_size:
+                    return
+                self._opening += 1
+            entry = self._open()
+            with self._cond:
+                if entry is not None:
+                    self._idle.append(entry)
+                    self._cond.notify()
+                if entry is None:
+                    return
+
+    def getconn(self, timeout=None):
+        """Check out a connection, blocking up to ``timeout`` seconds if the pool is exhausted"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError('Connection pool is closed')
+                    self._prune_locked()
+                    if self._idle:
+                        # LIFO keeps a hot working set and lets surplus connections idle out
+                        entry = self._idle.pop()
+                        self._pending += 1
+                        break
+                    if self.size < self.max_size:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            'Connection pool exhausted (max_size=%d)' % self.max_size
+                        )
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                entry = self._open(raise_errors=True)
+                with self._cond:
+                    self._in_use[id(entry.conn)] = entry
+                return entry.conn
+
+            if not self._is_usable(entry):
+                self._discard(entry)
+                continue
+            with self._cond:
+                self._pending -= 1
+                self._in_use[id(entry.conn)] = entry
+            return entry.conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool; broken or expired connections are closed"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+            if entry is not None:
+                self._pending += 1
+        if entry is None:
+            raise PoolError('Connection does not belong to this pool')
+
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        now = time.monotonic()
+        if discard or conn.closed or self._closed or now - entry.created_at > self.max_lifetime:
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._pending -= 1
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def closeall(self):
+        """Close idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            _close_quietly(entry.conn)
+
+    def _open(self, raise_errors=False):
+        """Open a new connection for a slot already reserved via ``_opening``"""
+        try:
+            conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            if raise_errors:
+                raise
+            return None
+        with self._cond:
+            self._opening -= 1
+        return _PooledConnection(conn)
+
+    def _is_usable(self, entry):
+        """Check lifetime and, if idle long enough, ping the server"""
+        now = time.monotonic()
+        if entry.conn.closed or now - entry.created_at > self.max_lifetime:
+            return False
+        if self.validate and now - entry.last_used >= self.validate_interval:
+            try:
+                with entry.conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                entry.conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _discard(self, entry):
+        """Close a pending connection and free its slot"""
+        _close_quietly(entry.conn)
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify()
+
+    def _prune_locked(self):
+        """Close connections idle past ``idle_timeout``, keeping ``min_size`` open"""
+        if not self._idle:
+            return
+        now = time.monotonic()
+        # The left end of the deque holds the least recently used connections
+        while self._idle and self.size > self.min_size:
+            entry = self._idle[0]
+            if now - entry.last_used <= self.idle_timeout:
+                break
+            self._idle.popleft()
+            _close_quietly(entry.conn)
+
+
+def _close_quietly(conn):
+    """Close a connection, ignoring errors from already-broken sockets"""
+    try:
+        conn.close()
+    except Exception:
+        pass
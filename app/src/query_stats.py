@@ -0,0 +1,139 @@
+"""
+Per-request database instrumentation for the Bagel Store application.
+
+Every statement run through ``database.get_db_cursor()`` is timed into the
+current request's ``QueryStats``: query count, total database time, time
+spent waiting for a pooled connection and the slowest statement. At the end
+of the request the numbers are folded into process-wide totals (overall and
+per endpoint), served as JSON at ``/metrics/db``. In debug mode, or with
+``SERVER_TIMING=true``, each response also carries a ``Server-Timing``
+header so the numbers show up in browser dev tools.
+"""
+
+import os
+import re
+import threading
+
+from flask import g, has_request_context, request
+
+# Longest statement text kept for the slowest query
+STATEMENT_PREVIEW_LENGTH = 200
+
+
+class QueryStats:
+    """Database counters for a single request"""
+
+    __slots__ = ('queries', 'db_time', 'acquire_time', 'slowest_time', 'slowest_statement')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.acquire_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record_query(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+    def record_acquire(self, elapsed):
+        self.acquire_time += elapsed
+
+
+def current_query_stats():
+    """Stats for the current request, or None outside of a request"""
+    if not has_request_context():
+        return None
+    stats = g.get('_query_stats')
+    if stats is None:
+        stats = g._query_stats = QueryStats()
+    return stats
+
+
+def statement_preview(statement):
+    """Single-line, truncated statement text"""
+    if isinstance(statement, bytes):
+        statement = statement.decode('utf-8', 'replace')
+    statement = re.sub(r'\s+', ' ', str(statement)).strip()
+    if len(statement) > STATEMENT_PREVIEW_LENGTH:
+        statement = statement[:STATEMENT_PREVIEW_LENGTH - 3] + '...'
+    return statement
+
+
+def _new_totals():
+    return {'requests': 0, 'queries': 0, 'db_time': 0.0, 'acquire_time': 0.0}
+
+
+_totals_lock = threading.Lock()
+_totals = dict(_new_totals(), slowest_time=0.0, slowest_statement=None)
+_endpoint_totals = {}
+
+
+def record_request(endpoint, stats):
+    """Fold one request's stats (None for a request without queries) into the process-wide totals"""
+    with _totals_lock:
+        endpoint_totals = _endpoint_totals.get(endpoint)
+        if endpoint_totals is None:
+            endpoint_totals = _endpoint_totals[endpoint] = _new_totals()
+        for totals in (_totals, endpoint_totals):
+            totals['requests'] += 1
+            if stats is not None:
+                totals['queries'] += stats.queries
+                totals['db_time'] += stats.db_time
+                totals['acquire_time'] += stats.acquire_time
+        if stats is not None and stats.slowest_time > _totals['slowest_time']:
+            _totals['slowest_time'] = stats.slowest_time
+            _totals['slowest_statement'] = statement_preview(stats.slowest_statement)
+
+
+def get_query_totals():
+    """Snapshot of the process-wide totals, with per-request averages"""
+    with _totals_lock:
+        totals = dict(_totals)
+        endpoints = {endpoint: dict(values) for endpoint, values in _endpoint_totals.items()}
+
+    for values in [totals] + list(endpoints.values()):
+        requests = values['requests']
+        values['queries_per_request'] = values['queries'] / requests if requests else 0.0
+        values['db_time_per_request'] = values['db_time'] / requests if requests else 0.0
+    totals['endpoints'] = endpoints
+    return totals
+
+
+def reset_query_totals():
+    """Zero the process-wide totals"""
+    with _totals_lock:
+        _totals.update(_new_totals(), slowest_time=0.0, slowest_statement=None)
+        _endpoint_totals.clear()
+
+
+def server_timing_header(stats):
+    """``Server-Timing`` value for one request's stats (durations in milliseconds)"""
+    parts = [
+        'db;dur=%.2f;desc="queries: %d"' % (stats.db_time * 1000, stats.queries),
+        'db-acquire;dur=%.2f' % (stats.acquire_time * 1000),
+    ]
+    if stats.slowest_statement is not None:
+        # desc is a quoted-string: swap out characters that would need escaping
+        description = statement_preview(stats.slowest_statement).replace('"', "'").replace('\\', '/')
+        parts.append('db-slowest;dur=%.2f;desc="%s"' % (stats.slowest_time * 1000, description))
+    return ', '.join(parts)
+
+
+def init_app(app):
+    """Add Server-Timing headers (debug or SERVER_TIMING=true) and fold stats into the totals"""
+    server_timing = os.environ.get('SERVER_TIMING', 'false').lower() == 'true'
+
+    @app.after_request
+    def add_server_timing(response):
+        # app.debug is read per request: `app.run(debug=True)` sets it after create_app()
+        if server_timing or app.debug:
+            response.headers.add('Server-Timing', server_timing_header(g.get('_query_stats') or QueryStats()))
+        return response
+
+    @app.teardown_request
+    def fold_query_stats(exc=None):
+        record_request(request.endpoint or 'unmatched', g.pop('_query_stats', None))
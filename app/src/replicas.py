@@ -0,0 +1,289 @@
+"""
+Read-replica routing for the Bagel Store application.
+
+With ``DATABASE_REPLICA_URLS`` set, read-only helpers (the catalog, order
+confirmation and the readiness probe) run on a streaming replica chosen
+round-robin, each with its own connection pool. Writes and everything else
+stay on the primary.
+
+A replica that fails to connect or loses its connection is marked down for
+``DB_REPLICA_RETRY_INTERVAL`` seconds and its reads fail over to the primary;
+after the interval the next read tries it again. After placing an order a
+session reads from the primary for ``DB_REPLICA_PIN_SECONDS`` so a customer
+always sees their own writes despite replication lag.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+from flask import g, has_request_context, session
+from psycopg2 import errorcodes
+from psycopg2.extensions import parse_dsn
+
+from database import (
+    execute_prepared,
+    execute_query,
+    get_db_cursor,
+    get_pool_config,
+    is_connection_error,
+    is_stale_statement_error,
+    query_prepared,
+    query_prepared_one,
+    stream_query,
+)
+from pool import ConnectionPool, PoolExhaustedError
+from query_stats import current_query_stats
+
+logger = logging.getLogger(__name__)
+
+PIN_SESSION_KEY = 'read_primary_until'
+
+# Replica-only query errors worth retrying on the primary: a query cancelled
+# by WAL replay ("canceling statement due to conflict with recovery"). The
+# replica itself is healthy, so these never take it out of rotation
+_FAILOVER_ERRORS = (errorcodes.SERIALIZATION_FAILURE, errorcodes.DEADLOCK_DETECTED)
+
+
+class ReplicaUnavailableError(Exception):
+    """Raised when a read cannot be served by a replica and should go to the primary"""
+
+
+def get_replica_urls():
+    """Replica DSNs from DATABASE_REPLICA_URLS (comma-separated); empty when unset"""
+    urls = os.environ.get('DATABASE_REPLICA_URLS', '')
+    return [url.strip() for url in urls.split(',') if url.strip()]
+
+
+def _replica_name(url):
+    """``host:port`` label for a replica, never including credentials"""
+    try:
+        params = parse_dsn(url)
+    except psycopg2.ProgrammingError:
+        return 'replica'
+    return '%s:%s' % (params.get('host', 'localhost'), params.get('port', '5432'))
+
+
+class Replica:
+    """A replica's connection pool and health"""
+
+    def __init__(self, url, retry_interval):
+        self.name = _replica_name(url)
+        self.pool = ConnectionPool(url, **get_pool_config())
+        self.retry_interval = retry_interval
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def mark_failed(self, error):
+        """Take the replica out of rotation for ``retry_interval`` seconds"""
+        if self.healthy:
+            logger.warning('Replica %s marked down for %.0fs: %s', self.name, self.retry_interval, error)
+        self.failures += 1
+        self.down_until = time.monotonic() + self.retry_interval
+
+    def mark_ok(self):
+        if self.failures:
+            logger.info('Replica %s is back after %d failure(s)', self.name, self.failures)
+            self.failures = 0
+
+    def run(self, work):
+        """Run ``work(cursor)`` in a read-only transaction on this replica.
+
+        Raises ReplicaUnavailableError when the primary should serve the read
+        instead; other query errors propagate.
+        """
+        started = time.perf_counter()
+        try:
+            conn = self.pool.getconn()
+        except PoolExhaustedError as e:
+            raise ReplicaUnavailableError(str(e)) from e
+        except psycopg2.Error as e:
+            self.mark_failed(e)
+            raise ReplicaUnavailableError(str(e)) from e
+        stats = current_query_stats()
+        if stats is not None:
+            stats.record_acquire(time.perf_counter() - started)
+
+        discard = False
+        try:
+            with get_db_cursor(conn) as cursor:
+                result = work(cursor)
+            conn.rollback()
+        except psycopg2.Error as e:
+            # Recovery conflicts are OperationalErrors too, but leave the connection usable
+            discard = is_connection_error(e) or bool(conn.closed)
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            if discard:
+                self.mark_failed(e)
+                raise ReplicaUnavailableError(str(e)) from e
+            if is_stale_statement_error(e) or e.pgcode in _FAILOVER_ERRORS:
+                raise ReplicaUnavailableError(str(e)) from e
+            raise
+        finally:
+            self.pool.putconn(conn, discard=discard)
+
+        self.mark_ok()
+        return result
+
+
+class ReplicaSet:
+    """Replicas of one process, picked round-robin among the healthy ones"""
+
+    def __init__(self, urls, retry_interval):
+        self.pid = os.getpid()
+        self.replicas = [Replica(url, retry_interval) for url in urls]
+        self._next = itertools.count()
+
+    def choose(self):
+        """Next healthy replica, or None when all are down (or none are configured)"""
+        count = len(self.replicas)
+        start = next(self._next)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            if replica.healthy:
+                return replica
+        return None
+
+    def status(self):
+        """Health of every replica, for the readiness probe"""
+        return [
+            {'name': replica.name, 'healthy': replica.healthy, 'failures': replica.failures}
+            for replica in self.replicas
+        ]
+
+    def closeall(self):
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+
+_replicas = None
+_replicas_lock = threading.Lock()
+
+
+def get_replicas():
+    """The process-wide ReplicaSet, created on first use (empty without DATABASE_REPLICA_URLS)"""
+    global _replicas
+    replicas = _replicas
+    if replicas is not None and replicas.pid == os.getpid():
+        return replicas
+
+    with _replicas_lock:
+        # Pools inherited across fork() are dropped without closing, as in database.get_pool()
+        if _replicas is None or _replicas.pid != os.getpid():
+            _replicas = ReplicaSet(
+                get_replica_urls(),
+                float(os.environ.get('DB_REPLICA_RETRY_INTERVAL', '30'))
+            )
+        return _replicas
+
+
+def close_replica_pools():
+    """Close all replica connections (e.g. on shutdown)"""
+    global _replicas
+    with _replicas_lock:
+        if _replicas is not None and _replicas.pid == os.getpid():
+            _replicas.closeall()
+        _replicas = None
+
+
+def pin_to_primary(seconds=None):
+    """Read from the primary for the rest of this request and, for ``seconds``, this session.
+
+    Called after a write the customer will read back, so replication lag can
+    never hide it. ``seconds`` defaults to DB_REPLICA_PIN_SECONDS.
+    """
+    if not has_request_context():
+        return
+    g._read_primary = True
+    if seconds is None:
+        seconds = float(os.environ.get('DB_REPLICA_PIN_SECONDS', '10'))
+    if seconds > 0 and get_replicas().replicas:
+        session[PIN_SESSION_KEY] = time.time() + seconds
+
+
+def should_read_primary():
+    """Whether the current request is pinned to the primary by a recent write"""
+    if not has_request_context():
+        return False
+    if g.get('_read_primary'):
+        return True
+    until = session.get(PIN_SESSION_KEY)
+    if until is None:
+        return False
+    if until > time.time():
+        return True
+    session.pop(PIN_SESSION_KEY, None)
+    return False
+
+
+def _read(work, on_primary):
+    """Run ``work(cursor)`` on a replica, falling back to ``on_primary()``"""
+    replicas = get_replicas()
+    if replicas.replicas and not should_read_primary():
+        replica = replicas.choose()
+        if replica is not None:
+            try:
+                return replica.run(work)
+            except ReplicaUnavailableError:
+                pass
+    return on_primary()
+
+
+def read_query(query, params=None):
+    """execute_query for a read-only statement, served by a replica when possible"""
+    def work(cursor):
+        cursor.execute(query, params or ())
+        return cursor.fetchall()
+
+    return _read(work, lambda: execute_query(query, params))
+
+
+def read_prepared(name, params=()):
+    """query_prepared for a read-only registered statement, served by a replica when possible"""
+    def work(cursor):
+        execute_prepared(cursor, name, params)
+        return cursor.fetchall()
+
+    return _read(work, lambda: query_prepared(name, params))
+
+
+def read_prepared_one(name, params=()):
+    """query_prepared_one for a read-only registered statement, served by a replica when possible"""
+    def work(cursor):
+        execute_prepared(cursor, name, params)
+        return cursor.fetchone()
+
+    return _read(work, lambda: query_prepared_one(name, params))
+
+
+def stream_read(query, params=None, itersize=None):
+    """stream_query on a replica when possible.
+
+    The replica is chosen once: a failure while opening the stream falls
+    back to the primary, but a stream cannot fail over part way through.
+    """
+    replicas = get_replicas()
+    if replicas.replicas and not should_read_primary():
+        replica = replicas.choose()
+        if replica is not None:
+            try:
+                return stream_query(query, params, itersize, pool=replica.pool)
+            except PoolExhaustedError:
+                pass
+            except psycopg2.Error as e:
+                if is_connection_error(e):
+                    replica.mark_failed(e)
+                elif e.pgcode not in _FAILOVER_ERRORS:
+                    raise
+    return stream_query(query, params, itersize)
@@ -0,0 +1,211 @@
+"""
+Order history and sales reporting for the Bagel Store application.
+
+Sales reports read the ``daily_sales`` rollup (changeset 012-create-daily-sales):
+one row per day and product. A year of daily totals is a few thousand rollup
+rows instead of a GROUP BY over every order line. Checkout and cancellation
+only append the order to ``sales_outbox`` (changeset 013-create-sales-outbox);
+the outbox worker folds batches of them into the rollup, so concurrent
+checkouts never queue on the same day's rows. Reports trail checkout by the
+worker's poll interval.
+
+Order history is newest first with keyset pagination on
+``(order_date, id)``, served by ``idx_orders_date``. Full exports stream order
+lines from a server-side cursor.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from database import run_in_transaction
+from models import DailySales, Order
+from pagination import decode_cursor, encode_cursor
+from replicas import read_query, stream_read
+
+# Rollup rows for a set of orders, as stored by drain_sales_outbox()
+_ORDER_SALES = '''SELECT o.order_date::date AS sales_date, oi.product_id,
+                         COUNT(DISTINCT o.id) AS order_count, SUM(oi.quantity) AS quantity,
+                         SUM(oi.quantity * oi.price) AS revenue
+                  FROM orders o
+                  JOIN order_items oi ON oi.order_id = o.id'''
+
+
+def record_sales(cursor, order_id):
+    """Queue a placed order for the rollup inside the checkout transaction"""
+    cursor.execute('INSERT INTO sales_outbox (order_id, sign) VALUES (%s, 1)', (order_id,))
+
+
+def remove_sales(cursor, order_ids):
+    """Queue cancelled orders to be subtracted from the rollup inside the caller's transaction"""
+    cursor.execute(
+        'INSERT INTO sales_outbox (order_id, sign) SELECT unnest(%s::int[]), -1',
+        (list(order_ids),)
+    )
+
+
+def drain_sales_outbox(batch_size=None):
+    """Fold up to ``batch_size`` queued orders into the rollup; returns how many were applied.
+
+    Rows are claimed with SKIP LOCKED like the inventory outbox, and the
+    batch is summed per day and product before the upsert, so a batch
+    touches each rollup row once, in key order.
+    """
+    if batch_size is None:
+        batch_size = int(os.environ.get('OUTBOX_BATCH_SIZE', '500'))
+
+    def work(cursor):
+        cursor.execute(
+            '''WITH batch AS (
+                   DELETE FROM sales_outbox
+                   WHERE id IN (
+                       SELECT id FROM sales_outbox
+                       ORDER BY id
+                       LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   )
+                   RETURNING order_id, sign
+               ),
+               applied AS (
+                   INSERT INTO daily_sales (sales_date, product_id, order_count, quantity, revenue)
+                   SELECT o.order_date::date, oi.product_id,
+                          SUM(b.sign), SUM(b.sign * oi.quantity), SUM(b.sign * oi.quantity * oi.price)
+                   FROM batch b
+                   JOIN orders o ON o.id = b.order_id
+                   JOIN order_items oi ON oi.order_id = o.id
+                   GROUP BY 1, 2
+                   ORDER BY 1, 2
+                   ON CONFLICT (sales_date, product_id) DO UPDATE
+                   SET order_count = daily_sales.order_count + EXCLUDED.order_count,
+                       quantity = daily_sales.quantity + EXCLUDED.quantity,
+                       revenue = daily_sales.revenue + EXCLUDED.revenue
+               )
+               SELECT COUNT(*) FROM batch''',
+            (batch_size,)
+        )
+        return cursor.fetchone()[0]
+
+    return run_in_transaction(work)
+
+
+def rebuild_sales_rollup(since=None):
+    """Recompute the rollup from orders, for every day or from ``since`` (a date) on.
+
+    Returns the number of rollup rows written. Queued orders in that range
+    are dropped because the rebuild already counts them; the outbox is
+    locked against new rows meanwhile, so checkouts wait for the rebuild.
+    """
+    def work(cursor):
+        # Waits for in-flight checkouts and drains, then keeps new rows out until commit
+        cursor.execute('LOCK TABLE sales_outbox IN SHARE ROW EXCLUSIVE MODE')
+        if since is None:
+            cursor.execute('DELETE FROM sales_outbox')
+            cursor.execute('DELETE FROM daily_sales')
+        else:
+            cursor.execute(
+                '''DELETE FROM sales_outbox so USING orders o
+                   WHERE o.id = so.order_id AND o.order_date >= %s''',
+                (since,)
+            )
+            cursor.execute('DELETE FROM daily_sales WHERE sales_date >= %s', (since,))
+        cursor.execute(
+            f'''INSERT INTO daily_sales (sales_date, product_id, order_count, quantity, revenue)
+                {_ORDER_SALES}
+                WHERE o.status <> 'cancelled' AND o.order_date >= %s
+                GROUP BY 1, 2''',
+            (since or datetime.min,)
+        )
+        return cursor.rowcount
+
+    return run_in_transaction(work)
+
+
+def get_daily_sales(start, end):
+    """Totals per day between ``start`` and ``end`` (dates, inclusive), oldest first"""
+    rows = read_query(
+        '''SELECT sales_date, SUM(order_count), SUM(quantity), SUM(revenue)
+           FROM daily_sales
+           WHERE sales_date BETWEEN %s AND %s
+           GROUP BY sales_date
+           ORDER BY sales_date''',
+        (start, end)
+    )
+    return [
+        {'sales_date': row[0], 'order_lines': row[1], 'quantity': row[2], 'revenue': row[3]}
+        for row in rows
+    ]
+
+
+def get_product_sales(start, end):
+    """Rollup rows per day and product between ``start`` and ``end`` (dates, inclusive)"""
+    rows = read_query(
+        '''SELECT ds.sales_date, ds.product_id, p.name, ds.order_count, ds.quantity, ds.revenue
+           FROM daily_sales ds
+           JOIN products p ON p.id = ds.product_id
+           WHERE ds.sales_date BETWEEN %s AND %s
+           ORDER BY ds.sales_date, ds.product_id''',
+        (start, end)
+    )
+    return [DailySales.from_db_row(row) for row in rows]
+
+
+def get_order_history(after=None, limit=50, status=None):
+    """One page of orders, newest first.
+
+    ``after`` is the ``next`` cursor of the previous page. Returns
+    ``(orders, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    conditions = ['order_date IS NOT NULL']
+    params = []
+    if status is not None:
+        conditions.append('status = %s')
+        params.append(status)
+    if after is not None:
+        order_date, order_id = decode_cursor(after, (datetime.fromisoformat, int))
+        # The plain range on order_date is what lets idx_orders_date bound the scan
+        conditions.append('order_date <= %s AND (order_date, id) < (%s, %s)')
+        params.extend([order_date, order_date, order_id])
+
+    # One extra row tells whether another page follows
+    rows = read_query(
+        f'''SELECT id, order_date, total_amount, status FROM orders
+            WHERE {' AND '.join(conditions)}
+            ORDER BY order_date DESC, id DESC
+            LIMIT %s''',
+        params + [limit + 1]
+    )
+    orders = [Order.from_db_row(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(orders[-1].order_date, orders[-1].id)
+    return orders, next_cursor
+
+
+def stream_order_lines(start=None, end=None, status=None):
+    """Every order line placed between ``start`` and ``end`` (dates, inclusive), oldest order first.
+
+    Rows are ``(order_id, order_date, status, total_amount, product_id,
+    product_name, quantity, price)`` streamed from a server-side cursor, so an
+    export of any size runs in constant memory. Close the result if it is not
+    read to the end.
+    """
+    conditions = ['o.order_date IS NOT NULL']
+    params = []
+    if start is not None:
+        conditions.append('o.order_date >= %s')
+        params.append(start)
+    if end is not None:
+        conditions.append('o.order_date < %s')
+        params.append(end + timedelta(days=1))
+    if status is not None:
+        conditions.append('o.status = %s')
+        params.append(status)
+
+    return stream_read(
+        f'''SELECT o.id, o.order_date, o.status, o.total_amount, oi.product_id, p.name, oi.quantity, oi.price
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            JOIN products p ON p.id = oi.product_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY o.order_date, o.id, oi.id''',
+        params
+    )
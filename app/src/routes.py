@@ -4,8 +4,22 @@ Flask routes for the Bagel Store application.
 
 import os
 from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify
-from database import execute_query, execute_one, get_db_connection, get_db_cursor
+from markupsafe import Markup
+from database import query_prepared, query_prepared_one, register_statement
 from models import Product, Order, OrderItem
+from catalog import (
+    compute_catalog_version, get_all_products, get_catalog_version, get_fragment, get_products_by_ids, set_fragment
+)
+from cart import (
+    InvalidQuantityError, add_item, build_cart_lines, clear_cart, load_cart, parse_quantity, remove_item
+)
+from orders import create_order
+from inventory import InsufficientStockError
+from health import check_readiness
+from replicas import pin_to_primary, read_prepared, read_prepared_one
+from sessions import regenerate_session
+from query_stats import get_query_totals
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
 
 bp = Blueprint('main', __name__)
 
@@ -25,16 +39,14 @@ if not DEMO_USERNAME or not DEMO_PASSWORD:
 @bp.route('/')
 def index():
     """Homepage - product catalog"""
-    products = execute_query(
-        'SELECT id, name, description, price FROM products ORDER BY name'
-    )
-
-    products_list = []
-    if products:
-        for row in products:
-            products_list.append(Product.from_db_row(row))
+    grid = get_fragment('product_grid', get_catalog_version())
+    if grid is None:
+        products_list = get_all_products()
+        grid = Markup(render_template('product_grid.html', products=products_list))
+        # Keyed by the products actually rendered, in case the catalog changed meanwhile
+        set_fragment('product_grid', compute_catalog_version(products_list), grid)
 
-    return render_template('index.html', products=products_list)
+    return render_template('index.html', product_grid=grid)
 
 
 @bp.route('/login', methods=['GET', 'POST'])
@@ -45,6 +57,7 @@ def login():
         password = request.form.get('password')
 
         if username == DEMO_USERNAME and password == DEMO_PASSWORD:
+            regenerate_session(session)
             session['user'] = username
             return redirect(url_for('main.index'))
         else:
@@ -57,31 +70,15 @@ def login():
 def logout():
     """Logout"""
     session.pop('user', None)
+    regenerate_session(session)
     return redirect(url_for('main.index'))
 
 
 @bp.route('/cart')
 def cart():
     """Shopping cart"""
-    cart_items = session.get('cart', [])
-
-    # Fetch product details for cart items
-    products = []
-    total = 0.0
-
-    for item in cart_items:
-        product_row = execute_one(
-            'SELECT id, name, description, price FROM products WHERE id = %s',
-            (item['product_id'],)
-        )
-        if product_row:
-            product = Product.from_db_row(product_row)
-            products.append({
-                'product': product,
-                'quantity': item['quantity'],
-                'subtotal': product.price * item['quantity']
-            })
-            total += product.price * item['quantity']
+    cart_items = load_cart(session)
+    products, total = build_cart_lines(cart_items)
 
     return render_template('cart.html', items=products, total=total)
 
@@ -89,31 +86,22 @@ def cart():
 @bp.route('/cart/add/<int:product_id>', methods=['POST'])
 def add_to_cart(product_id):
     """Add product to cart"""
-    quantity = int(request.form.get('quantity', 1))
-
-    cart = session.get('cart', [])
-
-    # Check if product already in cart
-    found = False
-    for item in cart:
-        if item['product_id'] == product_id:
-            item['quantity'] += quantity
-            found = True
-            break
+    try:
+        quantity = parse_quantity(request.form.get('quantity', 1))
+    except InvalidQuantityError as e:
+        return str(e), 400
 
-    if not found:
-        cart.append({'product_id': product_id, 'quantity': quantity})
+    product = get_products_by_ids([product_id]).get(product_id)
+    if product:
+        add_item(session, product, quantity)
 
-    session['cart'] = cart
     return redirect(url_for('main.cart'))
 
 
 @bp.route('/cart/remove/<int:product_id>', methods=['POST'])
 def remove_from_cart(product_id):
     """Remove product from cart"""
-    cart = session.get('cart', [])
-    cart = [item for item in cart if item['product_id'] != product_id]
-    session['cart'] = cart
+    remove_item(session, product_id)
     return redirect(url_for('main.cart'))
 
 
@@ -124,23 +112,8 @@ def checkout():
         return redirect(url_for('main.login'))
 
     # GET - show checkout page
-    cart_items = session.get('cart', [])
-    products = []
-    total = 0.0
-
-    for item in cart_items:
-        product_row = execute_one(
-            'SELECT id, name, description, price FROM products WHERE id = %s',
-            (item['product_id'],)
-        )
-        if product_row:
-            product = Product.from_db_row(product_row)
-            products.append({
-                'product': product,
-                'quantity': item['quantity'],
-                'subtotal': product.price * item['quantity']
-            })
-            total += product.price * item['quantity']
+    cart_items = load_cart(session)
+    products, total = build_cart_lines(cart_items)
 
     return render_template('checkout.html', items=products, total=total)
 
@@ -151,62 +124,59 @@ def place_order():
     if 'user' not in session:
         return redirect(url_for('main.login'))
 
-    cart = session.get('cart', [])
+    cart = load_cart(session)
 
     if not cart:
         return redirect(url_for('main.index'))
 
-    # Calculate total
-    total = 0.0
-    for item in cart:
-        product_row = execute_one(
-            'SELECT price FROM products WHERE id = %s',
-            (item['product_id'],)
+    try:
+        order_id = create_order(cart)
+    except InsufficientStockError as e:
+        # Keep the cart so the customer can adjust quantities
+        products, total = build_cart_lines(cart)
+        names = {line['product'].id: line['product'].name for line in products}
+        error = 'Not enough stock to complete your order: ' + ', '.join(
+            '%s (%d left)' % (names.get(product_id, 'product %d' % product_id), available)
+            for product_id, (requested, available) in sorted(e.shortages.items())
         )
-        if product_row:
-            total += float(product_row[0]) * item['quantity']
-
-    # Create order
-    with get_db_connection() as conn:
-        with get_db_cursor(conn) as cursor:
-            # Insert order
-            cursor.execute(
-                'INSERT INTO orders (order_date, total_amount, status) VALUES (NOW(), %s, %s) RETURNING id',
-                (total, 'pending')
-            )
-            order_id = cursor.fetchone()[0]
-
-            # Insert order items
-            for item in cart:
-                product_row = execute_one(
-                    'SELECT price FROM products WHERE id = %s',
-                    (item['product_id'],)
-                )
-                if product_row:
-                    cursor.execute(
-                        'INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)',
-                        (order_id, item['product_id'], item['quantity'], float(product_row[0]))
-                    )
-
-                    # Update inventory
-                    cursor.execute(
-                        'UPDATE inventory SET quantity = quantity - %s, last_updated = NOW() WHERE product_id = %s',
-                        (item['quantity'], item['product_id'])
-                    )
+        return render_template('cart.html', items=products, total=total, error=error), 409
+    except InvalidQuantityError as e:
+        products, total = build_cart_lines(cart)
+        return render_template('cart.html', items=products, total=total, error=str(e)), 400
 
     # Clear cart
-    session['cart'] = []
+    clear_cart(session)
+
+    if order_id is None:
+        return redirect(url_for('main.index'))
+
+    # Read the new order back from the primary until replicas have caught up
+    pin_to_primary()
 
     return redirect(url_for('main.order_confirmation', order_id=order_id))
 
 
+ORDER_BY_ID = register_statement(
+    'order_by_id',
+    'SELECT id, order_date, total_amount, status FROM orders WHERE id = %s'
+)
+ORDER_ITEMS_BY_ORDER = register_statement(
+    'order_items_by_order',
+    '''SELECT oi.id, oi.order_id, oi.product_id, oi.quantity, oi.price, p.name
+       FROM order_items oi
+       JOIN products p ON oi.product_id = p.id
+       WHERE oi.order_id = %s'''
+)
+
+
 @bp.route('/order/<int:order_id>')
 def order_confirmation(order_id):
     """Order confirmation page"""
-    order_row = execute_one(
-        'SELECT id, order_date, total_amount, status FROM orders WHERE id = %s',
-        (order_id,)
-    )
+    order_row = read_prepared_one(ORDER_BY_ID, (order_id,))
+    if not order_row:
+        # Possibly not replicated yet; the primary is authoritative
+        pin_to_primary(seconds=0)
+        order_row = query_prepared_one(ORDER_BY_ID, (order_id,))
 
     if not order_row:
         return redirect(url_for('main.index'))
@@ -214,81 +184,44 @@ def order_confirmation(order_id):
     order = Order.from_db_row(order_row)
 
     # Get order items
-    items_rows = execute_query(
-        '''SELECT oi.id, oi.order_id, oi.product_id, oi.quantity, oi.price, p.name
-           FROM order_items oi
-           JOIN products p ON oi.product_id = p.id
-           WHERE oi.order_id = %s''',
-        (order_id,)
-    )
+    items_rows = read_prepared(ORDER_ITEMS_BY_ORDER, (order_id,))
 
     items = []
     for row in items_rows:
         items.append({
             'product_name': row[5],
             'quantity': row[3],
-            'price': float(row[4]),
-            'subtotal': float(row[4]) * row[3]
+            'price': row[4],
+            'subtotal': row[4] * row[3]
         })
 
     return render_template('order_confirmation.html', order=order, items=items)
 
 
 @bp.route('/health')
+@bp.route('/health/ready')
 def health():
-    """Health check endpoint - verifies database connectivity and schema"""
-    checks = {
-        'status': 'healthy',
-        'database': 'unknown',
-        'schema': 'unknown',
-        'tables': []
-    }
+    """Readiness check - verifies database connectivity and schema (cached briefly)"""
+    checks, status_code = check_readiness()
+    return jsonify(checks), status_code
+
+
+@bp.route('/health/live')
+def health_live():
+    """Liveness check - the process is up and serving requests; no database access"""
+    return jsonify({'status': 'alive'}), 200
+
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return render_metrics(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
 
-    try:
-        # Test 1: Database connection
-        execute_one('SELECT 1')
-        checks['database'] = 'connected'
-
-        # Test 2: Verify critical tables exist
-        required_tables = ['products', 'orders', 'order_items', 'inventory']
-        existing_tables = []
-
-        for table in required_tables:
-            try:
-                # Check if table exists and has at least the expected structure
-                execute_one(f"SELECT COUNT(*) FROM {table} LIMIT 1")
-                existing_tables.append(table)
-            except Exception:
-                # Table doesn't exist
-                pass
-
-        checks['tables'] = existing_tables
-
-        # Determine overall schema status
-        if len(existing_tables) == len(required_tables):
-            checks['schema'] = 'complete'
-        elif len(existing_tables) > 0:
-            checks['schema'] = 'partial'
-            checks['status'] = 'degraded'
-            checks['missing_tables'] = list(set(required_tables) - set(existing_tables))
-        else:
-            checks['schema'] = 'missing'
-            checks['status'] = 'unhealthy'
-            checks['error'] = 'Database schema not initialized'
-
-        # Return appropriate status code
-        if checks['status'] == 'healthy':
-            return jsonify(checks), 200
-        elif checks['status'] == 'degraded':
-            return jsonify(checks), 503  # Service Unavailable
-        else:
-            return jsonify(checks), 500  # Internal Server Error
 
-    except Exception as e:
-        checks['status'] = 'unhealthy'
-        checks['database'] = 'disconnected'
-        checks['error'] = str(e)
-        return jsonify(checks), 500
+@bp.route('/metrics/db')
+def metrics_db():
+    """Aggregated per-request database counters since the process started"""
+    return jsonify(get_query_totals()), 200
 
 
 @bp.route('/version')
@@ -0,0 +1,116 @@
+"""
+Production server entry point for Bagel Store.
+
+Runs ``create_app()`` under Gunicorn with multiple worker processes and
+threads per worker. ``python src/app.py`` remains the development server.
+
+``SERVER_MODE=asgi`` runs the async storefront in ``asgi_app.py`` under
+Hypercorn instead: one event loop per worker process, with concurrency
+bounded by the asyncpg pool rather than by threads.
+
+Graceful reload: send ``SIGHUP`` to the master process to replace workers
+without dropping in-flight requests.
+"""
+
+import os
+
+from gunicorn.app.base import BaseApplication
+
+
+def get_server_config():
+    """Gunicorn settings from environment variables"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    threads = int(os.environ.get('WEB_THREADS', '4'))
+
+    return {
+        'bind': f"0.0.0.0:{os.environ.get('PORT', '5000')}",
+        # One worker per core available to the container
+        'workers': int(os.environ.get('WEB_CONCURRENCY', str(cpus))),
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'keepalive': int(os.environ.get('WEB_KEEPALIVE', '5')),
+        'timeout': int(os.environ.get('WEB_TIMEOUT', '30')),
+        'graceful_timeout': int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30')),
+        # Recycle workers periodically to bound memory growth; jitter avoids restarting them all at once
+        'max_requests': int(os.environ.get('WEB_MAX_REQUESTS', '1000')),
+        'max_requests_jitter': int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '100')),
+        'accesslog': os.environ.get('WEB_ACCESS_LOG') or None,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+def get_asgi_config():
+    """Hypercorn settings for ``SERVER_MODE=asgi``, from the same environment variables"""
+    from hypercorn.config import Config
+
+    wsgi_config = get_server_config()
+    config = Config()
+    # A file path, so each spawned worker can import the app whatever the working directory
+    here = os.path.dirname(os.path.abspath(__file__))
+    config.application_path = f"{os.path.join(here, 'asgi_app.py')}:create_asgi_app()"
+    config.bind = [wsgi_config['bind']]
+    config.workers = wsgi_config['workers']
+    config.keep_alive_timeout = wsgi_config['keepalive']
+    config.graceful_timeout = wsgi_config['graceful_timeout']
+    config.max_requests = wsgi_config['max_requests'] or None
+    config.max_requests_jitter = wsgi_config['max_requests_jitter']
+    config.accesslog = wsgi_config['accesslog']
+    return config
+
+
+def post_worker_init(worker):
+    """Load templates, open the pool's minimum connections and start the outbox worker before accepting requests"""
+    from database import get_pool
+    from outbox import should_start_worker, start_outbox_worker
+    from templating import compile_templates
+    compile_templates(worker.wsgi)
+    if should_start_worker():
+        start_outbox_worker()
+    try:
+        get_pool().warm()
+    except Exception:
+        worker.log.exception('Connection pool warm-up failed; connections will open on demand')
+
+
+def worker_exit(server, worker):
+    """Close pooled connections and stop background threads when a worker exits"""
+    from database import close_pool
+    from outbox import stop_outbox_worker
+    stop_outbox_worker()
+    close_pool()
+
+
+class StorefrontServer(BaseApplication):
+    """Gunicorn application that loads ``create_app()`` inside each worker.
+
+    The app is not preloaded in the master, so every worker builds its own
+    connection pool and background threads after fork.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from app import create_app
+        return create_app()
+
+
+def main():
+    mode = os.environ.get('SERVER_MODE', 'wsgi').lower()
+    if mode == 'asgi':
+        from hypercorn.run import run
+        raise SystemExit(run(get_asgi_config()))
+    if mode != 'wsgi':
+        raise ValueError(f'Unknown SERVER_MODE: {mode}')
+    StorefrontServer(get_server_config()).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Server-side session storage for the Bagel Store application.
+
+By default Flask keeps the whole session (including the cart) in a signed
+cookie. With ``SESSION_BACKEND=postgres`` or ``SESSION_BACKEND=sqlite`` only a
+signed session id travels in the cookie and the data lives server-side.
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+from itsdangerous import BadSignature, Signer
+
+from database import execute_one, get_db_connection, get_db_cursor
+
+
+class ServerSideSession(SecureCookieSession):
+    """Session dict that also remembers its server-side id and expiry"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = new
+        # Id given up by regenerate(), deleted from the store on save
+        self.replaced_sid = None
+
+    def regenerate(self):
+        """Move the session to a fresh id, so an id known before a login is worthless after it"""
+        if not self.new and self.replaced_sid is None:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class PostgresSessionStore:
+    """Sessions in the ``sessions`` table (changeset 010-create-sessions-table)"""
+
+    def load(self, sid):
+        row = execute_one(
+            'SELECT data, expires_at FROM sessions WHERE id = %s AND expires_at > NOW()',
+            (sid,)
+        )
+        if not row:
+            return None
+        return row[0], row[1]
+
+    def save(self, sid, data, expires_at):
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    '''INSERT INTO sessions (id, data, expires_at) VALUES (%s, %s, %s)
+                       ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at''',
+                    (sid, data, expires_at)
+                )
+
+    def delete(self, sid):
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute('DELETE FROM sessions WHERE id = %s', (sid,))
+
+    def sweep(self, batch_size=1000):
+        """Delete expired sessions in batches; returns the number removed"""
+        removed = 0
+        while True:
+            # One short transaction per batch keeps locks and WAL bursts small
+            with get_db_connection() as conn:
+                with get_db_cursor(conn) as cursor:
+                    cursor.execute(
+                        '''DELETE FROM sessions WHERE id IN (
+                               SELECT id FROM sessions WHERE expires_at <= NOW() LIMIT %s
+                           )''',
+                        (batch_size,)
+                    )
+                    count = cursor.rowcount
+            removed += count
+            if count < batch_size:
+                return removed
+
+
+class SQLiteSessionStore:
+    """Sessions in a local SQLite file, for single-host deployments"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                '''CREATE TABLE IF NOT EXISTS sessions (
+                       id TEXT PRIMARY KEY,
+                       data TEXT NOT NULL,
+                       expires_at REAL NOT NULL
+                   )'''
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)')
+
+    def _connect(self):
+        # sqlite3 connections are not shareable across threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._connect().execute(
+            'SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?',
+            (sid, _now().timestamp())
+        ).fetchone()
+        if not row:
+            return None
+        return row[0], datetime.fromtimestamp(row[1], timezone.utc)
+
+    def save(self, sid, data, expires_at):
+        with self._connect() as conn:
+            conn.execute(
+                '''INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                   ON CONFLICT (id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at''',
+                (sid, data, expires_at.timestamp())
+            )
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def sweep(self, batch_size=1000):
+        """Delete expired sessions in batches; returns the number removed"""
+        removed = 0
+        while True:
+            with self._connect() as conn:
+                count = conn.execute(
+                    '''DELETE FROM sessions WHERE id IN (
+                           SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?
+                       )''',
+                    (_now().timestamp(), batch_size)
+                ).rowcount
+            removed += count
+            if count < batch_size:
+                return removed
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface keeping session data in a server-side store.
+
+    Unmodified sessions are only written back (to slide their expiry) once
+    less than half of their lifetime remains, so read-only page views cost
+    one lookup and no write.
+    """
+
+    serializer = session_json_serializer
+    session_class = ServerSideSession
+
+    def __init__(self, store, lifetime):
+        self.store = store
+        self.lifetime = lifetime
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                stored = self.store.load(sid)
+                if stored is not None:
+                    data, expires_at = stored
+                    return self.session_class(self.serializer.loads(data), sid=sid, expires_at=expires_at)
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.replaced_sid is not None:
+            self.store.delete(session.replaced_sid)
+            session.replaced_sid = None
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = _now()
+        refresh_due = session.expires_at is None or session.expires_at - now < self.lifetime / 2
+        if not session.modified and not refresh_due:
+            return
+
+        expires_at = now + self.lifetime
+        self.store.save(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode(),
+            expires=expires_at,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def regenerate_session(session):
+    """Issue a new session id on a privilege change (login or logout).
+
+    Only server-side sessions have an id to fix; a cookie session is
+    re-signed with its new contents anyway.
+    """
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
+
+def get_session_store():
+    """Build the configured session store, or None for Flask's cookie sessions"""
+    backend = os.environ.get('SESSION_BACKEND', 'cookie').lower()
+    if backend == 'postgres':
+        return PostgresSessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore(os.environ.get('SESSION_SQLITE_PATH', 'sessions.db'))
+    if backend != 'cookie':
+        raise ValueError(f'Unknown SESSION_BACKEND: {backend}')
+    return None
+
+
+def get_session_lifetime():
+    """How long an idle server-side session is kept"""
+    return timedelta(seconds=int(os.environ.get('SESSION_LIFETIME', '86400')))
+
+
+def init_app(app):
+    """Install the server-side session interface when a backend is configured"""
+    store = get_session_store()
+    if store is not None:
+        app.session_interface = ServerSideSessionInterface(store, get_session_lifetime())
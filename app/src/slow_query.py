@@ -0,0 +1,137 @@
+"""
+Slow query log for the Bagel Store application.
+
+Statements run through ``database.get_db_cursor()`` that take at least
+``SLOW_QUERY_MS`` milliseconds are logged with their text, redacted
+parameters, duration and the route that issued them. A sampled fraction
+(``SLOW_QUERY_EXPLAIN_SAMPLE``) of slow read-only statements is re-run under
+``EXPLAIN (ANALYZE, BUFFERS)`` and the plan is logged with it, so plan
+regressions show up in application logs without enabling
+``log_min_duration_statement`` on the whole cluster.
+"""
+
+import logging
+import os
+import random
+import re
+from datetime import date, datetime
+from decimal import Decimal
+
+import psycopg2
+import psycopg2.extensions
+from flask import has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the slow query log
+SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_MS', '500')) / 1000
+EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', '0'))
+
+# Longest statement text written to the log
+MAX_STATEMENT_LENGTH = 2000
+
+# A run of a prepared statement registered with database.register_statement()
+_EXECUTE = re.compile(r'EXECUTE\s+(\w+)', re.IGNORECASE)
+
+# Values safe to log as-is: identifiers, quantities, prices and timestamps
+_PLAIN_TYPES = (bool, int, float, Decimal, date, datetime, type(None))
+
+
+def is_slow(elapsed):
+    """Whether a statement that took ``elapsed`` seconds belongs in the slow query log"""
+    return 0 < SLOW_QUERY_THRESHOLD <= elapsed
+
+
+def redact_params(params):
+    """Parameters with strings and other free-form values replaced by type placeholders"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return tuple(_redact(value) for value in params)
+    return _redact(params)
+
+
+def _redact(value):
+    if isinstance(value, _PLAIN_TYPES):
+        return value
+    if isinstance(value, (list, tuple)):
+        if all(isinstance(item, _PLAIN_TYPES) for item in value):
+            return list(value)
+        return f'<{type(value).__name__} of {len(value)}>'
+    if isinstance(value, (str, bytes)):
+        return f'<{type(value).__name__} of length {len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def _statement_text(statement):
+    if isinstance(statement, bytes):
+        statement = statement.decode('utf-8', 'replace')
+    statement = re.sub(r'\s+', ' ', str(statement)).strip()
+    if len(statement) > MAX_STATEMENT_LENGTH:
+        statement = statement[:MAX_STATEMENT_LENGTH - 3] + '...'
+    return statement
+
+
+def _is_explainable(statement):
+    """Only plain SELECTs are re-run: EXPLAIN ANALYZE executes the statement again.
+
+    ``EXECUTE name (...)`` of a registered statement is judged by the SQL it
+    was prepared from, and explained as is so the plan is the prepared one.
+    """
+    if isinstance(statement, bytes):
+        statement = statement.decode('utf-8', 'replace')
+    text = str(statement).strip()
+    match = _EXECUTE.match(text)
+    if match:
+        from database import get_statement_sql
+        text = (get_statement_sql(match.group(1).lower()) or '').strip()
+    text = re.sub(r'\s+', ' ', text).upper()
+    return text.startswith('SELECT') and ' FOR UPDATE' not in text and ' FOR SHARE' not in text
+
+
+def log_slow_query(cursor, statement, params, elapsed, explain=True):
+    """Log a slow statement, with a sampled EXPLAIN (ANALYZE, BUFFERS) plan"""
+    route = (request.endpoint or request.path) if has_request_context() else '-'
+    plan = None
+    if explain and EXPLAIN_SAMPLE_RATE > 0 and random.random() < EXPLAIN_SAMPLE_RATE and _is_explainable(statement):
+        plan = _explain(cursor, statement, params)
+
+    logger.warning(
+        'Slow query: %.1f ms route=%s statement=%s params=%r%s',
+        elapsed * 1000,
+        route,
+        _statement_text(statement),
+        redact_params(params),
+        '\n' + plan if plan else ''
+    )
+
+
+def _explain(cursor, statement, params):
+    """Plan for ``statement`` from a separate cursor on the same connection.
+
+    Runs inside a savepoint so a failed EXPLAIN cannot abort the caller's
+    transaction; returns None when no plan could be captured.
+    """
+    conn = cursor.connection
+    if conn.closed or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+        return None
+
+    explain_cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    try:
+        explain_cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            explain_cursor.execute(b'EXPLAIN (ANALYZE, BUFFERS) ' + cursor.mogrify(statement, params))
+            plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+            explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            return plan
+        except psycopg2.Error:
+            logger.exception('EXPLAIN of slow query failed')
+            explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return None
+    except psycopg2.Error:
+        logger.exception('Could not capture a plan for a slow query')
+        return None
+    finally:
+        explain_cursor.close()
@@ -0,0 +1,48 @@
+"""
+Jinja template settings shared by the Flask and ASGI storefronts.
+
+Compiled templates are kept in a bytecode cache on disk, so a new worker
+process (including one recycled after ``WEB_MAX_REQUESTS``) loads them
+instead of parsing and compiling every template again. Entries are keyed by
+template source, so an edited template is recompiled automatically.
+
+The ASGI storefront compiles templates for async rendering, and that code
+cannot be run by the sync Flask app (or the other way round), but Jinja's
+cache keys do not tell the two apart. Each mode therefore writes its own files
+(``__jinja2_%s.cache`` and ``__jinja2_async_%s.cache``), even when both share
+``TEMPLATE_BYTECODE_CACHE_DIR``.
+"""
+
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+
+def get_bytecode_cache(is_async=False):
+    """Filesystem bytecode cache for compiled templates, or None when disabled"""
+    if os.environ.get('TEMPLATE_BYTECODE_CACHE', 'true').lower() != 'true':
+        return None
+    directory = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Without a directory Jinja uses a private per-user folder in the temp directory
+    pattern = '__jinja2_async_%s.cache' if is_async else '__jinja2_%s.cache'
+    return FileSystemBytecodeCache(directory or None, pattern)
+
+
+def init_app(app, is_async=False):
+    """Give ``app`` the bytecode cache; call before anything renders.
+
+    Pass ``is_async=True`` for the Quart app, whose templates compile to async code.
+    """
+    cache = get_bytecode_cache(is_async)
+    if cache is not None:
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': cache}
+
+
+def compile_templates(app):
+    """Load every template once so no request pays for compiling one; returns the number loaded"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
@@ -3,6 +3,7 @@ Pytest configuration and fixtures for Bagel Store tests.
 """
 
 import os
+import sys
 import pytest
 import time
 import psycopg2
@@ -25,6 +26,10 @@ DB_CONFIG = {
     "password": "postgres"
 }
 
+# Tests that load application modules in-process use the same database
+SRC_DIR = Path(__file__).parent.parent / "src"
+DATABASE_URL = "postgresql://{user}:{password}@{host}:{port}/{database}".format(**DB_CONFIG)
+
 # Demo credentials from environment variables
 DEMO_USERNAME = os.getenv('DEMO_USERNAME', 'demo')
 DEMO_PASSWORD = os.getenv('DEMO_PASSWORD')
@@ -73,6 +78,16 @@ def wait_for_services():
     print("🚀 All services ready for testing\n")
 
 
+@pytest.fixture(scope="session")
+def app_modules(wait_for_services):
+    """Make the modules in src/ importable, pointed at the test database."""
+    os.environ.setdefault("DATABASE_URL", DATABASE_URL)
+    os.environ.setdefault("DEMO_USERNAME", DEMO_USERNAME)
+    os.environ.setdefault("DEMO_PASSWORD", DEMO_PASSWORD)
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+
+
 @pytest.fixture(scope="function")
 def db_connection():
     """Provide a database connection for tests that need to validate DB state."""
@@ -140,3 +155,23 @@ def browser_context_args(browser_context_args, wait_for_services):
         "viewport": {"width": 1280, "height": 720},
         "ignore_https_errors": True,
     }
+
+
+@pytest.fixture(scope="function")
+def restore_inventory(app_modules, db_connection, clean_test_orders):
+    """Put every product's stock back in its base row and drop stripes and pending outbox rows afterwards."""
+    cursor = db_connection.cursor()
+    cursor.execute("""
+        SELECT i.product_id,
+               i.quantity + COALESCE((SELECT SUM(quantity) FROM inventory_stripes s WHERE s.product_id = i.product_id), 0)
+        FROM inventory i
+    """)
+    saved = cursor.fetchall()
+    db_connection.commit()
+    yield
+    cursor.execute("DELETE FROM inventory_outbox")
+    cursor.execute("DELETE FROM inventory_stripes")
+    for product_id, quantity in saved:
+        cursor.execute("UPDATE inventory SET quantity = %s WHERE product_id = %s", (quantity, product_id))
+    db_connection.commit()
+    cursor.close()
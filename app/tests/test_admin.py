@@ -0,0 +1,177 @@
+"""
+Operations API (/admin) tests that run the Flask app in-process against the test database.
+"""
+
+import pytest
+
+
+ADMIN_USERNAME = "kitchen"
+ADMIN_PASSWORD = "kitchen-password"
+API_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin_env(app_modules, monkeypatch):
+    """Admin credentials and API token configured, cookie sessions."""
+    monkeypatch.setenv("ADMIN_USERNAME", ADMIN_USERNAME)
+    monkeypatch.setenv("ADMIN_PASSWORD", ADMIN_PASSWORD)
+    monkeypatch.setenv("ADMIN_API_TOKEN", API_TOKEN)
+    monkeypatch.setenv("SESSION_BACKEND", "cookie")
+
+
+@pytest.fixture
+def client(admin_env):
+    from app import create_app
+    return create_app().test_client()
+
+
+@pytest.fixture
+def pending_order(restore_inventory):
+    """Id of a freshly placed (pending) order."""
+    from orders import create_order
+    return create_order([{"product_id": 1, "quantity": 1}])
+
+
+def admin_login(client):
+    """Open an admin session on ``client`` and return its CSRF token"""
+    response = client.post("/admin/login", json={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    assert response.status_code == 200
+    return response.get_json()["csrf_token"]
+
+
+def test_storefront_login_grants_no_admin_access(client, app_modules):
+    """Test that a shopper's session cannot reach the admin API."""
+    import os
+    response = client.post(
+        "/login",
+        data={"username": os.environ["DEMO_USERNAME"], "password": os.environ["DEMO_PASSWORD"]}
+    )
+    assert response.status_code == 302
+
+    assert client.get("/admin/orders").status_code == 401
+    assert client.post("/admin/orders/status", json={"order_ids": [], "status": "preparing"}).status_code == 401
+
+
+@pytest.mark.parametrize("password", ["wrong", ""])
+def test_admin_login_rejects_bad_credentials(client, password):
+    """Test that only ADMIN_USERNAME/ADMIN_PASSWORD open an admin session."""
+    response = client.post("/admin/login", json={"username": ADMIN_USERNAME, "password": password})
+
+    assert response.status_code == 401
+    assert client.get("/admin/orders").status_code == 401
+
+
+def test_admin_login_is_disabled_without_credentials(client, monkeypatch):
+    """Test that an unset ADMIN_PASSWORD does not accept an empty one."""
+    monkeypatch.delenv("ADMIN_PASSWORD")
+
+    response = client.post("/admin/login", json={"username": ADMIN_USERNAME, "password": ""})
+
+    assert response.status_code == 401
+
+
+def test_session_writes_require_csrf_token(client, pending_order):
+    """Test that an admin session can read freely but must send the CSRF token to write."""
+    csrf_token = admin_login(client)
+    payload = {"order_ids": [pending_order], "status": "preparing"}
+
+    assert client.get("/admin/orders/queue").status_code == 200
+    assert client.post("/admin/orders/status", json=payload).status_code == 403
+    response = client.post("/admin/orders/status", json=payload, headers={"X-CSRF-Token": "not-the-token"})
+    assert response.status_code == 403
+
+    response = client.post("/admin/orders/status", json=payload, headers={"X-CSRF-Token": csrf_token})
+    assert response.status_code == 200
+    assert response.get_json()["updated"] == [pending_order]
+
+
+def test_admin_logout_ends_the_session(client):
+    """Test that after logout the admin session no longer authenticates."""
+    csrf_token = admin_login(client)
+
+    assert client.post("/admin/logout", headers={"X-CSRF-Token": csrf_token}).status_code == 200
+    assert client.get("/admin/orders").status_code == 401
+
+
+def test_api_token_needs_no_session_or_csrf_token(client, pending_order):
+    """Test that scripts authenticate with the bearer token alone."""
+    headers = {"Authorization": f"Bearer {API_TOKEN}"}
+
+    assert client.get("/admin/orders", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/admin/orders/queue?status=pending", headers=headers)
+    assert response.status_code == 200
+    assert pending_order in [order["id"] for order in response.get_json()["orders"]]
+
+    response = client.post(f"/admin/orders/{pending_order}/status", json={"status": "preparing"}, headers=headers)
+    assert response.status_code == 200
+    # Already preparing, so it cannot move to preparing again
+    response = client.post(f"/admin/orders/{pending_order}/status", json={"status": "preparing"}, headers=headers)
+    assert response.status_code == 409
+
+
+def test_sales_report_and_export(client, pending_order):
+    """Test that the read-only reports answer for the API token."""
+    headers = {"Authorization": f"Bearer {API_TOKEN}"}
+
+    response = client.get("/admin/reports/sales", headers=headers)
+    assert response.status_code == 200
+    assert set(response.get_json()) >= {"start", "end", "revenue", "quantity", "sales"}
+
+    response = client.get("/admin/orders/export?format=csv", headers=headers)
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith("order_id,order_date,status")
+    assert any(line.startswith(f"{pending_order},") for line in lines[1:])
+
+    response = client.get("/admin/reports/sales?start=2025-02-01&end=2025-01-01", headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "postgres"])
+def test_login_issues_a_new_session_id(admin_env, monkeypatch, tmp_path, backend):
+    """Test that a session id known before login is useless afterwards (session fixation)."""
+    monkeypatch.setenv("SESSION_BACKEND", backend)
+    monkeypatch.setenv("SESSION_SQLITE_PATH", str(tmp_path / "sessions.db"))
+    from app import create_app
+
+    app = create_app()
+    cookie_name = app.config["SESSION_COOKIE_NAME"]
+    attacker = app.test_client()
+    # Anything stored in the session gives it a server-side id
+    attacker.post("/cart/add/1", data={"quantity": "1"})
+    planted = attacker.get_cookie(cookie_name).value
+
+    victim = app.test_client()
+    victim.set_cookie(cookie_name, planted)
+    admin_login(victim)
+    assert victim.get_cookie(cookie_name).value != planted
+    assert victim.get("/admin/orders").status_code == 200
+
+    # The planted id was deleted, not upgraded
+    assert attacker.get("/admin/orders").status_code == 401
+    assert app.session_interface.store.load(
+        app.session_interface._signer(app).unsign(planted).decode()
+    ) is None
+
+
+def test_catalog_import_requires_the_api_token(client, db_connection):
+    """Test that an admin session, even with its CSRF token, cannot import a catalog."""
+    import io
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT price FROM products WHERE id = 1")
+    price = cursor.fetchone()[0]
+    db_connection.commit()
+    cursor.close()
+
+    def upload():
+        return {"products": (io.BytesIO(f"id,price\n1,{price}\n".encode()), "products.csv")}
+
+    csrf_token = admin_login(client)
+    response = client.post("/admin/catalog/import", data=upload(), headers={"X-CSRF-Token": csrf_token})
+    assert response.status_code == 403
+
+    response = client.post("/admin/catalog/import", data=upload(), headers={"Authorization": f"Bearer {API_TOKEN}"})
+    assert response.status_code == 200
+    # Same price as before, so nothing changed
+    assert response.get_json() == {"products": 0, "inventory": 0}
@@ -0,0 +1,79 @@
+"""
+Session cart tests that run the Flask app in-process against the test database.
+"""
+
+import re
+
+import pytest
+
+
+@pytest.fixture
+def client(app_modules, monkeypatch):
+    """Test client with Server-Timing on, cookie sessions and a private catalog cache."""
+    import catalog
+    from app import create_app
+
+    monkeypatch.setenv("SERVER_TIMING", "true")
+    monkeypatch.setenv("SESSION_BACKEND", "cookie")
+    monkeypatch.setattr(catalog, "_cache", catalog.CatalogCache(ttl=60, max_size=1000, check_interval=3600))
+    return create_app().test_client()
+
+
+@pytest.fixture
+def product_price(db_connection):
+    """Put back product 1's price (and tell every cache) afterwards."""
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT price FROM products WHERE id = 1")
+    saved = cursor.fetchone()[0]
+    db_connection.commit()
+    yield saved
+    cursor.execute("UPDATE products SET price = %s WHERE id = 1", (saved,))
+    cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    db_connection.commit()
+    cursor.close()
+
+
+def query_count(response):
+    """Statements the request ran, from its Server-Timing header"""
+    match = re.search(r'desc="queries: (\d+)"', response.headers["Server-Timing"])
+    return int(match.group(1))
+
+
+def test_warm_cart_page_runs_no_queries(client):
+    """Test that with the catalog cached the cart is built from session snapshots alone."""
+    assert client.post("/cart/add/1", data={"quantity": "2"}).status_code == 302
+    client.get("/cart")
+
+    response = client.get("/cart")
+
+    assert response.status_code == 200
+    assert "Plain Bagel" in response.get_data(as_text=True)
+    assert query_count(response) == 0
+
+
+def test_snapshot_is_repriced_when_the_catalog_version_changes(client, product_price, db_connection, monkeypatch):
+    """Test that a cart priced before an import shows the new price once the version moves."""
+    import catalog
+    # Read catalog_version on every lookup
+    monkeypatch.setattr(catalog, "_cache", catalog.CatalogCache(ttl=60, max_size=1000, check_interval=0))
+
+    assert client.post("/cart/add/1", data={"quantity": "1"}).status_code == 302
+    with client.session_transaction() as session:
+        assert session["cart"][0]["price"] == str(product_price)
+        old_version = session["cart_version"]
+
+    new_price = product_price + 1
+    cursor = db_connection.cursor()
+    cursor.execute("UPDATE products SET price = %s WHERE id = 1", (new_price,))
+    cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    db_connection.commit()
+    cursor.close()
+
+    response = client.get("/cart")
+
+    assert response.status_code == 200
+    assert query_count(response) > 0
+    assert f"${new_price}" in response.get_data(as_text=True)
+    with client.session_transaction() as session:
+        assert session["cart"][0]["price"] == str(new_price)
+        assert session["cart_version"] != old_version
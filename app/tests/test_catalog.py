@@ -0,0 +1,280 @@
+"""
+Catalog cache and import tests; the cache unit tests run on a fake clock,
+the rest in-process against the test database.
+"""
+
+import pytest
+
+
+@pytest.fixture
+def fresh_cache(app_modules, monkeypatch):
+    """A private catalog cache that reads the shared version on every lookup."""
+    import catalog
+    cache = catalog.CatalogCache(ttl=60, max_size=1000, check_interval=0)
+    monkeypatch.setattr(catalog, "_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def product_description(db_connection):
+    """Put back product 1's description (and tell every cache) afterwards."""
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT description FROM products WHERE id = 1")
+    saved = cursor.fetchone()[0]
+    db_connection.commit()
+    yield
+    cursor.execute("UPDATE products SET description = %s WHERE id = 1", (saved,))
+    cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    db_connection.commit()
+    cursor.close()
+
+
+class FakeClock:
+    """Stands in for the ``time`` module in catalog; advanced by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(app_modules, monkeypatch):
+    import catalog
+    fake = FakeClock()
+    monkeypatch.setattr(catalog, "time", fake)
+    return fake
+
+
+def test_entries_expire_after_ttl(clock):
+    """Test that an entry is served until its TTL runs out and then counts as a miss."""
+    from catalog import CatalogCache
+    cache = CatalogCache(ttl=10, max_size=10)
+    cache.set("key", "value")
+
+    clock.now += 9.9
+    assert cache.get("key") == (True, "value")
+    clock.now += 0.2
+    assert cache.get("key") == (False, None)
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    """Test that a read keeps an entry and the oldest unread one goes past max_size."""
+    from catalog import CatalogCache
+    cache = CatalogCache(ttl=10, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+
+
+def test_hit_and_miss_counters(clock):
+    """Test that stats() counts fresh hits, misses and expired reads."""
+    from catalog import CatalogCache
+    cache = CatalogCache(ttl=10, max_size=10)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    clock.now += 11
+    cache.get("a")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_disabled_cache_stores_nothing(clock):
+    """Test that CATALOG_CACHE_TTL=0 turns set() into a no-op."""
+    from catalog import CatalogCache
+    cache = CatalogCache(ttl=0, max_size=10)
+    cache.set("a", 1)
+
+    assert cache.get("a") == (False, None)
+    assert not cache.version_check_due()
+
+
+def test_shared_version_change_drops_entries(clock):
+    """Test that the version is read once per interval and only a changed one clears the cache."""
+    from catalog import CatalogCache
+    cache = CatalogCache(ttl=60, max_size=10, check_interval=1)
+
+    assert cache.version_check_due()
+    assert not cache.version_check_due()
+    cache.observe_version(7)
+    cache.set("a", 1)
+
+    clock.now += 1
+    assert cache.version_check_due()
+    cache.observe_version(7)
+    assert cache.get("a") == (True, 1)
+
+    clock.now += 1
+    assert cache.version_check_due()
+    cache.observe_version(8)
+    assert cache.get("a") == (False, None)
+
+
+def test_invalidate_one_key_or_everything(clock):
+    """Test that invalidate() drops one entry by key and the whole cache without one."""
+    from catalog import CatalogCache
+    cache = CatalogCache(ttl=60, max_size=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.invalidate("a")
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, 2)
+
+    cache.invalidate()
+    assert cache.get("b") == (False, None)
+
+
+def describe(products, product_id):
+    return next(product.description for product in products if product.id == product_id)
+
+
+def test_cache_is_dropped_when_another_process_bumps_the_version(fresh_cache, product_description, db_connection):
+    """Test that a catalog change made elsewhere reaches this process through catalog_version."""
+    from catalog import get_all_products, get_products_by_ids
+
+    before = describe(get_all_products(), 1)
+    cursor = db_connection.cursor()
+    cursor.execute("UPDATE products SET description = 'Changed by another worker' WHERE id = 1")
+    db_connection.commit()
+
+    # Without a version bump the cached catalog is still served
+    assert describe(get_all_products(), 1) == before
+
+    cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    db_connection.commit()
+    cursor.close()
+
+    assert describe(get_all_products(), 1) == "Changed by another worker"
+    assert get_products_by_ids([1])[1].description == "Changed by another worker"
+
+
+def test_import_bumps_the_shared_version(fresh_cache, db_connection):
+    """Test that a products import moves catalog_version and an inventory-only import does not."""
+    import io
+    from catalog_import import import_catalog
+
+    def version():
+        cursor = db_connection.cursor()
+        cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+        value = cursor.fetchone()[0]
+        db_connection.commit()
+        cursor.close()
+        return value
+
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT price FROM products WHERE id = 1")
+    price = cursor.fetchone()[0]
+    cursor.execute("SELECT quantity FROM inventory WHERE product_id = 1")
+    quantity = cursor.fetchone()[0]
+    db_connection.commit()
+    cursor.close()
+    start = version()
+
+    import_catalog(inventory_file=io.BytesIO(f"product_id,quantity\n1,{quantity}\n".encode()))
+    assert version() == start
+
+    # A file with only some columns updates those and keeps the rest
+    try:
+        counts = import_catalog(products_file=io.BytesIO(f"id,price\n1,{price + 1}\n".encode()))
+        assert counts == {"products": 1, "inventory": 0}
+        assert version() == start + 1
+    finally:
+        import_catalog(products_file=io.BytesIO(f"id,price\n1,{price}\n".encode()))
+
+
+def stock(db_connection, product_id):
+    """(base quantity, [stripe quantities]) for a product"""
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT quantity FROM inventory WHERE product_id = %s", (product_id,))
+    base = cursor.fetchone()[0]
+    cursor.execute("SELECT quantity FROM inventory_stripes WHERE product_id = %s ORDER BY stripe", (product_id,))
+    stripes = [row[0] for row in cursor.fetchall()]
+    db_connection.commit()
+    cursor.close()
+    return base, stripes
+
+
+def test_set_import_locks_base_rows_before_stripes(restore_inventory, db_connection):
+    """Test that an import waiting on a base row holds no stripe locks, as checkout expects."""
+    import io
+    import threading
+    import psycopg2
+    from catalog_import import import_catalog
+    from inventory import restripe_inventory
+
+    restripe_inventory(4)
+    other = psycopg2.connect(db_connection.dsn)
+    # A transaction would keep reading one pg_stat_activity snapshot
+    other.autocommit = True
+    try:
+        blocker = db_connection.cursor()
+        blocker.execute("SELECT quantity FROM inventory WHERE product_id = 1 FOR UPDATE")
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(counts=import_catalog(
+            inventory_file=io.BytesIO(b"product_id,quantity\n2,30\n1,40\n")
+        )))
+        thread.start()
+
+        # Wait until the import is queued on product 1's base row
+        probe = other.cursor()
+        for _ in range(100):
+            probe.execute(
+                "SELECT COUNT(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND query LIKE '%%INSERT INTO inventory%%'"
+            )
+            if probe.fetchone()[0]:
+                break
+            thread.join(timeout=0.05)
+        else:
+            pytest.fail("the import never waited on the locked base row")
+        # Checkout would take these stripe locks next; the import must not hold them yet
+        probe.execute(
+            "SELECT stripe FROM inventory_stripes WHERE product_id IN (1, 2) ORDER BY product_id, stripe FOR UPDATE NOWAIT"
+        )
+
+        db_connection.rollback()
+        thread.join(timeout=10)
+        assert result["counts"] == {"products": 0, "inventory": 2}
+    finally:
+        db_connection.rollback()
+        other.close()
+
+    assert stock(db_connection, 1) == (40, [0, 0, 0, 0])
+    assert stock(db_connection, 2) == (30, [0, 0, 0, 0])
+    # Products outside the file keep their stripes
+    assert sum(stock(db_connection, 3)[1]) > 0
+
+
+def test_import_retries_a_deadlock(restore_inventory, db_connection, monkeypatch):
+    """Test that an import chosen as a deadlock victim is run again from the start of its file."""
+    import io
+    import catalog_import
+
+    merge = catalog_import._merge_inventory
+    calls = []
+
+    def deadlock_once(cursor, mode):
+        calls.append(mode)
+        if len(calls) == 1:
+            cursor.execute("DO $$ BEGIN RAISE EXCEPTION 'deadlock' USING ERRCODE = '40P01'; END $$")
+        return merge(cursor, mode)
+
+    monkeypatch.setattr(catalog_import, "_merge_inventory", deadlock_once)
+    monkeypatch.setenv("DB_RETRY_BASE_DELAY", "0")
+
+    counts = catalog_import.import_catalog(inventory_file=io.BytesIO(b"product_id,quantity\n1,41\n"))
+
+    assert counts == {"products": 0, "inventory": 1}
+    assert calls == ["set", "set"]
+    assert stock(db_connection, 1) == (41, [])
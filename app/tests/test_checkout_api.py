@@ -0,0 +1,74 @@
+"""
+Checkout tests that drive the storefront over HTTP without a browser.
+"""
+
+import os
+import pytest
+import requests
+
+
+APP_URL = "http://localhost:5001"
+DEMO_USERNAME = os.getenv('DEMO_USERNAME', 'demo')
+DEMO_PASSWORD = os.getenv('DEMO_PASSWORD')
+
+
+def stock_level(db_connection, product_id):
+    """Base row plus stripes, as checkout sees it"""
+    cursor = db_connection.cursor()
+    cursor.execute("""
+        SELECT i.quantity + COALESCE((SELECT SUM(quantity) FROM inventory_stripes WHERE product_id = i.product_id), 0)
+        FROM inventory i
+        WHERE i.product_id = %s
+    """, (product_id,))
+    quantity = cursor.fetchone()[0]
+    db_connection.commit()
+    cursor.close()
+    return quantity
+
+
+@pytest.fixture(scope="function")
+def shopper(wait_for_services):
+    """A logged-in requests session with an empty cart."""
+    session = requests.Session()
+    response = session.post(
+        f"{APP_URL}/login",
+        data={"username": DEMO_USERNAME, "password": DEMO_PASSWORD},
+        allow_redirects=False
+    )
+    assert response.status_code == 302
+    yield session
+    session.close()
+
+
+@pytest.mark.e2e
+def test_checkout_rejects_cart_larger_than_stock(shopper, db_connection):
+    """Test that ordering more than is in stock returns 409 and writes nothing."""
+    available = stock_level(db_connection, 1)
+
+    response = shopper.post(f"{APP_URL}/cart/add/1", data={"quantity": available + 1}, allow_redirects=False)
+    assert response.status_code == 302
+
+    response = shopper.post(f"{APP_URL}/checkout/place-order", allow_redirects=False)
+
+    assert response.status_code == 409
+    assert "Not enough stock to complete your order" in response.text
+    assert f"({available} left)" in response.text
+    assert stock_level(db_connection, 1) == available
+
+    # The cart is kept so the customer can adjust it
+    assert "Plain Bagel" in shopper.get(f"{APP_URL}/cart").text
+
+
+@pytest.mark.e2e
+@pytest.mark.parametrize("quantity", ["-5", "0", "two"])
+def test_add_to_cart_rejects_invalid_quantity(shopper, db_connection, quantity):
+    """Test that a quantity below 1 never reaches the cart or inventory."""
+    available = stock_level(db_connection, 2)
+
+    response = shopper.post(f"{APP_URL}/cart/add/2", data={"quantity": quantity}, allow_redirects=False)
+    assert response.status_code == 400
+
+    response = shopper.post(f"{APP_URL}/checkout/place-order", allow_redirects=False)
+    assert response.status_code == 302
+    assert "/order/" not in response.headers["Location"]
+    assert stock_level(db_connection, 2) == available
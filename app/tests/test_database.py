@@ -0,0 +1,86 @@
+"""
+Request-scoped connection tests that run the Flask app in-process against the test database.
+"""
+
+import pytest
+
+
+@pytest.fixture
+def pool(app_modules):
+    """A small private pool installed as the process-wide one for the test."""
+    import os
+    from database import close_pool, install_pool
+    from pool import ConnectionPool
+
+    pool = ConnectionPool(os.environ["DATABASE_URL"], min_size=0, max_size=2, timeout=0)
+    install_pool(pool)
+    yield pool
+    close_pool()
+
+
+@pytest.fixture
+def app(pool):
+    from app import create_app
+    return create_app()
+
+
+def test_request_reuses_one_connection_and_returns_it(app, pool, monkeypatch):
+    """Test that every query in a request runs on one checkout, handed back at teardown."""
+    from flask import jsonify
+    from database import execute_one, execute_query, get_db_connection, get_db_cursor
+
+    checkouts = []
+    getconn = pool.getconn
+    monkeypatch.setattr(pool, "getconn", lambda *args, **kwargs: checkouts.append(1) or getconn(*args, **kwargs))
+
+    @app.route("/_test/backends")
+    def backends():
+        pids = [execute_one("SELECT pg_backend_pid()")[0], execute_query("SELECT pg_backend_pid()")[0][0]]
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                pids.append(cursor.fetchone()[0])
+        return jsonify(pids=pids, in_use=pool.stats()["in_use"])
+
+    response = app.test_client().get("/_test/backends")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(set(body["pids"])) == 1
+    assert body["in_use"] == 1
+    assert len(checkouts) == 1
+    assert pool.stats() == {"size": 1, "idle": 1, "in_use": 0, "min_size": 0, "max_size": 2}
+
+
+def test_failed_request_is_rolled_back(app, pool):
+    """Test that teardown rolls back the request's writes when it raised."""
+    from database import get_request_connection, release_request_connection
+
+    with app.app_context():
+        conn = get_request_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TABLE request_rollback_probe (id INTEGER)")
+        release_request_connection(RuntimeError("view failed"))
+
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('request_rollback_probe')")
+            assert cursor.fetchone() == (None,)
+    finally:
+        pool.putconn(conn)
+
+
+def test_failed_commit_discards_the_connection(app, pool):
+    """Test that a connection whose commit fails at teardown is closed, not pooled."""
+    from database import get_request_connection
+
+    with app.app_context():
+        conn = get_request_connection()
+        with conn.cursor() as cursor:
+            # The duplicate is only caught when teardown commits
+            cursor.execute("CREATE TEMP TABLE commit_probe (id INTEGER UNIQUE DEFERRABLE INITIALLY DEFERRED)")
+            cursor.execute("INSERT INTO commit_probe VALUES (1), (1)")
+
+    assert conn.closed
+    assert pool.stats()["size"] == 0
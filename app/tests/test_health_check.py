@@ -77,3 +77,26 @@ def test_database_has_sample_data(db_connection):
         assert quantity >= 45  # Should have at least 45 units (may be consumed by other tests)
 
     cursor.close()
+
+
+@pytest.mark.health
+def test_liveness_endpoint():
+    """Test that /health/live responds without checking the database."""
+    response = requests.get(f"{APP_URL}/health/live")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "alive"
+
+
+@pytest.mark.health
+def test_readiness_endpoint_reports_schema():
+    """Test that /health/ready verifies connectivity and all required tables."""
+    response = requests.get(f"{APP_URL}/health/ready")
+
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["status"] == "healthy"
+    assert data["database"] == "connected"
+    assert data["schema"] == "complete"
+    assert sorted(data["tables"]) == ["inventory", "order_items", "orders", "products"]
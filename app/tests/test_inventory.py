@@ -0,0 +1,93 @@
+"""
+Inventory reservation tests that run checkouts in-process against the test database.
+"""
+
+import threading
+import pytest
+
+
+PRODUCT_IDS = [1, 2, 3]
+
+
+def total_stock(db_connection):
+    """Base row plus stripes per test product"""
+    cursor = db_connection.cursor()
+    cursor.execute("""
+        SELECT i.product_id,
+               i.quantity + COALESCE((SELECT SUM(quantity) FROM inventory_stripes s WHERE s.product_id = i.product_id), 0)
+        FROM inventory i
+        WHERE i.product_id = ANY(%s)
+        ORDER BY i.product_id
+    """, (PRODUCT_IDS,))
+    stock = dict(cursor.fetchall())
+    db_connection.commit()
+    cursor.close()
+    return stock
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("stripes", [0, 4])
+def test_concurrent_checkouts_sell_exactly_the_stock(restore_inventory, db_connection, monkeypatch, stripes):
+    """Test that overlapping carts neither deadlock nor oversell, striped or not."""
+    import psycopg2
+    from inventory import InsufficientStockError, restripe_inventory
+    from orders import create_order
+
+    cursor = db_connection.cursor()
+    cursor.execute("UPDATE inventory SET quantity = 60 WHERE product_id = ANY(%s)", (PRODUCT_IDS,))
+    db_connection.commit()
+    cursor.close()
+    monkeypatch.setenv("INVENTORY_STRIPES", str(stripes))
+    monkeypatch.setenv("INVENTORY_ASYNC", "false")
+    restripe_inventory(stripes)
+
+    sold = {product_id: 0 for product_id in PRODUCT_IDS}
+    errors = []
+    lock = threading.Lock()
+
+    def shopper(offset):
+        # Every cart holds all three products, listed in a different order per thread
+        cart = [{"product_id": PRODUCT_IDS[(offset + i) % 3], "quantity": 1 + i} for i in range(3)]
+        for _ in range(10):
+            try:
+                create_order(cart)
+            except InsufficientStockError:
+                continue
+            except psycopg2.Error as e:
+                errors.append(e)
+                continue
+            with lock:
+                for item in cart:
+                    sold[item["product_id"]] += item["quantity"]
+
+    threads = [threading.Thread(target=shopper, args=(n,)) for n in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stock = total_stock(db_connection)
+    for product_id in PRODUCT_IDS:
+        assert stock[product_id] >= 0
+        assert stock[product_id] == 60 - sold[product_id]
+    # Carts stop fitting only once some product is (nearly) sold out
+    assert min(stock.values()) < 3
+
+
+def test_stock_left_in_stripes_is_sold_with_striping_off(restore_inventory, db_connection, monkeypatch):
+    """Test that turning INVENTORY_STRIPES off before folding stripes back hides no stock."""
+    from inventory import InsufficientStockError, restripe_inventory
+    from orders import create_order
+
+    monkeypatch.setenv("INVENTORY_ASYNC", "false")
+    restripe_inventory(4)
+    monkeypatch.setenv("INVENTORY_STRIPES", "0")
+    stock = total_stock(db_connection)[1]
+
+    assert create_order([{"product_id": 1, "quantity": 5}]) is not None
+    assert total_stock(db_connection)[1] == stock - 5
+
+    with pytest.raises(InsufficientStockError) as raised:
+        create_order([{"product_id": 1, "quantity": stock}])
+    assert raised.value.shortages == {1: (stock, stock - 5)}
@@ -39,7 +39,7 @@ def test_databasechangelog_table_exists(db_connection):
 
 @pytest.mark.deployment
 def test_expected_changesets_applied(db_connection):
-    """Verify all 9 changesets from changelog were applied in correct order."""
+    """Verify all 16 changesets from changelog were applied in correct order."""
     cursor = db_connection.cursor()
 
     cursor.execute("""
@@ -49,7 +49,7 @@ def test_expected_changesets_applied(db_connection):
     """)
     changesets = cursor.fetchall()
 
-    assert len(changesets) == 9, f"Expected 9 changesets, found {len(changesets)}"
+    assert len(changesets) == 16, f"Expected 16 changesets, found {len(changesets)}"
 
     # Verify specific changesets in expected order
     expected = [
@@ -62,6 +62,13 @@ def test_expected_changesets_applied(db_connection):
         ('006-seed-products', 'demo', 'changesets/006-seed-products.sql'),
         ('007-seed-inventory', 'demo', 'changesets/007-seed-inventory.sql'),
         ('tag-v1.0.0', 'demo', 'db/changelog/changelog-master.yaml'),
+        ('008-create-inventory-stripes', 'demo', 'changesets/008-create-inventory-stripes.sql'),
+        ('009-create-inventory-outbox', 'demo', 'changesets/009-create-inventory-outbox.sql'),
+        ('010-create-sessions-table', 'demo', 'changesets/010-create-sessions-table.sql'),
+        ('011-create-orders-queue-index', 'demo', 'changesets/011-create-orders-queue-index.sql'),
+        ('012-create-daily-sales', 'demo', 'changesets/012-create-daily-sales.sql'),
+        ('013-create-sales-outbox', 'demo', 'changesets/013-create-sales-outbox.sql'),
+        ('014-create-catalog-version', 'demo', 'changesets/014-create-catalog-version.sql'),
     ]
 
     for i, (expected_id, expected_author, expected_filename) in enumerate(expected):
@@ -79,12 +86,18 @@ def test_all_tables_created(db_connection):
     """Verify all expected tables were created by Liquibase changesets."""
     cursor = db_connection.cursor()
 
-    # Expected tables from changesets 001-004
+    # Expected tables from changesets 001-004, 008-010 and 012-014
     expected_tables = [
         'products',
         'inventory',
         'orders',
         'order_items',
+        'inventory_stripes',
+        'inventory_outbox',
+        'sessions',
+        'daily_sales',
+        'sales_outbox',
+        'catalog_version',
         'databasechangelog',
         'databasechangeloglock'
     ]
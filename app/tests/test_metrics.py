@@ -0,0 +1,63 @@
+"""
+Prometheus metrics tests that run the Flask and ASGI apps in-process against the test database.
+"""
+
+import asyncio
+import os
+import re
+
+
+def sample(text, name, **labels):
+    """Value of the one sample of ``name`` whose labels include ``labels``"""
+    values = []
+    for line in text.splitlines():
+        match = re.match(r'(\w+)\{(.*)\} (\S+)$', line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+        if all(found.get(key) == str(value) for key, value in labels.items()):
+            values.append(float(match.group(3)))
+    assert len(values) == 1, f"{name} {labels}: {values}"
+    return values[0]
+
+
+def test_flask_metrics_are_labelled_with_the_worker(app_modules):
+    """Test that every series names the process that served the scrape."""
+    from app import create_app
+
+    client = create_app().test_client()
+    before = client.get("/metrics").get_data(as_text=True)
+    client.get("/version")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+    worker = os.getpid()
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            assert f'worker="{worker}"' in line, line
+
+    count = "bagel_http_request_duration_seconds_count"
+    previous = sample(before, count, worker=worker, endpoint="main.version") if "main.version" in before else 0
+    assert sample(text, count, worker=worker, endpoint="main.version") == previous + 1
+
+
+def test_asgi_app_serves_metrics(app_modules):
+    """Test that the async storefront times requests and reports its asyncpg pool."""
+    from asgi_app import create_asgi_app
+
+    async def scrape():
+        app = create_asgi_app()
+        async with app.test_app():
+            client = app.test_client()
+            await client.get("/health/live")
+            response = await client.get("/metrics")
+            return response.status_code, await response.get_data(as_text=True)
+
+    status, text = asyncio.run(scrape())
+
+    assert status == 200
+    worker = os.getpid()
+    assert sample(text, "bagel_http_request_duration_seconds_count", worker=worker, endpoint="main.health_live") >= 1
+    assert sample(text, "bagel_db_async_pool_max_connections", worker=worker) > 0
@@ -0,0 +1,69 @@
+"""
+Order placement tests that run checkouts in-process against the test database.
+"""
+
+import pytest
+
+
+@pytest.fixture
+def sync_inventory(restore_inventory, monkeypatch):
+    """Checkout reserves stock itself, from unstriped rows."""
+    monkeypatch.setenv("INVENTORY_ASYNC", "false")
+    monkeypatch.setenv("INVENTORY_STRIPES", "0")
+
+
+def place_counting_queries(cart_items):
+    """(order id, statements run) for one create_order call inside a request"""
+    from flask import Flask
+    from database import release_request_connection
+    from orders import create_order
+    from query_stats import current_query_stats
+
+    with Flask(__name__).test_request_context("/checkout/place-order", method="POST"):
+        try:
+            order_id = create_order(cart_items)
+            return order_id, current_query_stats().queries
+        finally:
+            release_request_connection()
+
+
+def test_order_items_are_written_with_database_prices(sync_inventory, db_connection):
+    """Test that every cart line becomes one order item priced from products, duplicates merged."""
+    from orders import create_order
+
+    order_id = create_order([
+        {"product_id": 3, "quantity": 1},
+        {"product_id": 1, "quantity": 2},
+        {"product_id": 3, "quantity": "2"},
+    ])
+
+    cursor = db_connection.cursor()
+    cursor.execute(
+        """SELECT oi.product_id, oi.quantity, oi.price, p.price
+           FROM order_items oi JOIN products p ON p.id = oi.product_id
+           WHERE oi.order_id = %s ORDER BY oi.product_id""",
+        (order_id,)
+    )
+    items = cursor.fetchall()
+    cursor.execute("SELECT total_amount, status FROM orders WHERE id = %s", (order_id,))
+    total, status = cursor.fetchone()
+    db_connection.commit()
+    cursor.close()
+
+    assert [(product_id, quantity) for product_id, quantity, _, _ in items] == [(1, 2), (3, 3)]
+    for _, _, price, product_price in items:
+        assert price == product_price
+    assert total == sum(quantity * price for _, quantity, price, _ in items)
+    assert status == "pending"
+
+
+def test_statement_count_does_not_grow_with_the_cart(sync_inventory):
+    """Test that a five-product cart takes as many statements as a one-product cart."""
+    one_id, one_product = place_counting_queries([{"product_id": 1, "quantity": 1}])
+    five_id, five_products = place_counting_queries(
+        [{"product_id": product_id, "quantity": 1} for product_id in range(1, 6)]
+    )
+
+    assert one_id is not None and five_id is not None
+    assert one_product > 0
+    assert five_products == one_product
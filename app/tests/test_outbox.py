@@ -0,0 +1,75 @@
+"""
+Asynchronous inventory (outbox) tests that run in-process against the test database.
+"""
+
+import time
+
+import pytest
+
+
+def stock_rows(db_connection, product_id):
+    """(base quantity, striped quantity) for a product"""
+    cursor = db_connection.cursor()
+    cursor.execute("""
+        SELECT i.quantity, COALESCE((SELECT SUM(quantity) FROM inventory_stripes s WHERE s.product_id = i.product_id), 0)
+        FROM inventory i
+        WHERE i.product_id = %s
+    """, (product_id,))
+    row = cursor.fetchone()
+    db_connection.commit()
+    cursor.close()
+    return row
+
+
+def wait_until_drained(db_connection, order_ids):
+    """Drain until the orders have left the outbox (a server's worker may be draining too)"""
+    from outbox import drain_outbox
+
+    cursor = db_connection.cursor()
+    deadline = time.monotonic() + 10
+    while True:
+        drain_outbox()
+        cursor.execute("SELECT COUNT(*) FROM inventory_outbox WHERE order_id = ANY(%s)", (order_ids,))
+        pending = cursor.fetchone()[0]
+        db_connection.commit()
+        if not pending:
+            break
+        assert time.monotonic() < deadline, f"orders {order_ids} were never applied to inventory"
+        time.sleep(0.05)
+    cursor.close()
+
+
+@pytest.mark.parametrize("stripes", [0, 4])
+def test_drain_applies_orders_to_base_row_and_stripes(restore_inventory, db_connection, monkeypatch, stripes):
+    """Test that draining the outbox takes stock from wherever it is held."""
+    from inventory import restripe_inventory
+    from orders import create_order
+
+    monkeypatch.setenv("INVENTORY_ASYNC", "true")
+    monkeypatch.setenv("INVENTORY_STRIPES", str(stripes))
+    restripe_inventory(stripes)
+    base, striped = stock_rows(db_connection, 1)
+
+    order_ids = [create_order([{"product_id": 1, "quantity": 4}]) for _ in range(3)]
+    assert None not in order_ids
+
+    wait_until_drained(db_connection, order_ids)
+
+    new_base, new_striped = stock_rows(db_connection, 1)
+    assert new_base + new_striped == base + striped - 12
+    assert new_base >= 0
+    assert new_striped >= 0
+
+
+def test_create_app_does_not_start_outbox_worker(app_modules, monkeypatch):
+    """Test that CLI processes built with create_app() leave draining to the servers."""
+    monkeypatch.setenv("INVENTORY_ASYNC", "true")
+    monkeypatch.setenv("OUTBOX_WORKER", "thread")
+    import outbox
+    from app import create_app
+
+    outbox.stop_outbox_worker()
+    create_app()
+
+    assert outbox._worker is None
+    assert outbox.should_start_worker()
@@ -0,0 +1,138 @@
+"""
+Connection pool tests that open real connections to the test database.
+"""
+
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def make_pool(app_modules):
+    """Build ConnectionPools on the test database and close them afterwards."""
+    import os
+    from pool import ConnectionPool
+
+    pools = []
+
+    def make(cls=ConnectionPool, **kwargs):
+        pool = cls(os.environ["DATABASE_URL"], **{"min_size": 0, **kwargs})
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.closeall()
+
+
+def test_exhausted_pool_fails_fast_without_timeout(make_pool):
+    """Test that timeout=0 raises PoolExhaustedError instead of opening past max_size."""
+    from pool import PoolExhaustedError
+
+    pool = make_pool(max_size=1, timeout=0)
+    conn = pool.getconn()
+
+    with pytest.raises(PoolExhaustedError):
+        pool.getconn()
+
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+
+def test_connections_being_validated_count_towards_max_size(make_pool):
+    """Test that a slow checkout ping does not let other threads open extra connections."""
+    from pool import ConnectionPool
+
+    class SlowValidationPool(ConnectionPool):
+        def _is_usable(self, entry):
+            time.sleep(0.2)
+            return super()._is_usable(entry)
+
+    pool = make_pool(cls=SlowValidationPool, max_size=2, validate_interval=0)
+    warm = [pool.getconn(), pool.getconn()]
+    for conn in warm:
+        pool.putconn(conn)
+
+    held = set()
+    peak = []
+    errors = []
+    lock = threading.Lock()
+
+    def borrow():
+        try:
+            conn = pool.getconn()
+        except Exception as e:
+            errors.append(e)
+            return
+        with lock:
+            held.add(id(conn))
+            peak.append(max(len(held), pool.size))
+        time.sleep(0.05)
+        with lock:
+            held.discard(id(conn))
+        pool.putconn(conn)
+
+    threads = [threading.Thread(target=borrow) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(peak) == 4
+    assert max(peak) <= 2
+    assert pool.stats()["size"] <= 2
+
+
+def test_checkout_replaces_a_connection_the_server_closed(make_pool, db_connection):
+    """Test that validation notices a terminated backend and hands out a fresh connection."""
+    pool = make_pool(max_size=1, validate_interval=0)
+    conn = pool.getconn()
+    pid = conn.get_backend_pid()
+    pool.putconn(conn)
+
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT pg_terminate_backend(%s)", (pid,))
+    db_connection.commit()
+    cursor.close()
+
+    fresh = pool.getconn()
+    assert fresh.get_backend_pid() != pid
+    with fresh.cursor() as check:
+        check.execute("SELECT 1")
+        assert check.fetchone() == (1,)
+    assert pool.stats() == {"size": 1, "idle": 0, "in_use": 1, "min_size": 0, "max_size": 1}
+
+
+def test_discarded_connection_frees_its_slot(make_pool):
+    """Test that putconn(discard=True) closes the connection and lets a new one open."""
+    pool = make_pool(max_size=1, timeout=0)
+    conn = pool.getconn()
+
+    pool.putconn(conn, discard=True)
+
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert not replacement.closed
+
+
+def test_failed_transaction_is_rolled_back_on_return(make_pool):
+    """Test that a connection returned mid-transaction is rolled back and reused."""
+    import psycopg2
+
+    pool = make_pool(max_size=1, timeout=0)
+    conn = pool.getconn()
+    with conn.cursor() as cursor:
+        with pytest.raises(psycopg2.Error):
+            cursor.execute("SELECT 1 / 0")
+
+    pool.putconn(conn)
+
+    again = pool.getconn()
+    assert again is conn
+    with again.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        assert cursor.fetchone() == (1,)
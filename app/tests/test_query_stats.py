@@ -0,0 +1,77 @@
+"""
+Per-request query statistics tests that run the Flask app in-process against the test database.
+"""
+
+import re
+
+import pytest
+
+
+def make_app(monkeypatch, server_timing):
+    """Flask app with a route that runs exactly two statements"""
+    from app import create_app
+    from database import execute_one
+
+    monkeypatch.setenv("SERVER_TIMING", "true" if server_timing else "false")
+    app = create_app()
+
+    @app.route("/_test/two-queries")
+    def two_queries():
+        execute_one("SELECT 1")
+        execute_one("SELECT pg_sleep(0.01)")
+        return "ok"
+
+    return app
+
+
+@pytest.fixture
+def totals(app_modules):
+    """Process-wide totals zeroed before and after the test."""
+    from query_stats import reset_query_totals
+    reset_query_totals()
+    yield
+    reset_query_totals()
+
+
+def test_server_timing_header_reports_the_request(app_modules, monkeypatch):
+    """Test that SERVER_TIMING=true adds db, db-acquire and db-slowest entries."""
+    client = make_app(monkeypatch, server_timing=True).test_client()
+
+    header = client.get("/_test/two-queries").headers["Server-Timing"]
+
+    assert re.search(r'(^|, )db;dur=[\d.]+;desc="queries: 2"', header)
+    assert re.search(r'(^|, )db-acquire;dur=[\d.]+', header)
+    slowest = re.search(r'db-slowest;dur=([\d.]+);desc="([^"]*)"', header)
+    assert float(slowest.group(1)) >= 10
+    assert "pg_sleep" in slowest.group(2)
+
+
+def test_server_timing_header_is_off_by_default(app_modules, monkeypatch):
+    """Test that outside debug mode the header needs SERVER_TIMING=true."""
+    client = make_app(monkeypatch, server_timing=False).test_client()
+
+    assert "Server-Timing" not in client.get("/_test/two-queries").headers
+
+
+def test_metrics_db_totals_per_endpoint(app_modules, monkeypatch, totals):
+    """Test that /metrics/db sums requests and queries overall and per endpoint."""
+    client = make_app(monkeypatch, server_timing=False).test_client()
+    for _ in range(3):
+        assert client.get("/_test/two-queries").status_code == 200
+
+    data = client.get("/metrics/db").get_json()
+
+    # The /metrics/db request itself is folded in only after it responds
+    assert data["requests"] == 3
+    assert data["queries"] == 6
+    assert data["queries_per_request"] == 2.0
+    assert data["db_time"] > 0
+    assert "pg_sleep" in data["slowest_statement"]
+    endpoint = data["endpoints"]["two_queries"]
+    assert (endpoint["requests"], endpoint["queries"]) == (3, 6)
+
+    data = client.get("/metrics/db").get_json()
+    assert data["endpoints"]["main.metrics_db"] == {
+        "requests": 1, "queries": 0, "db_time": 0.0, "acquire_time": 0.0,
+        "queries_per_request": 0.0, "db_time_per_request": 0.0,
+    }
@@ -0,0 +1,47 @@
+"""
+Read-replica failover tests that use the test database as its own replica.
+"""
+
+import pytest
+
+
+RECOVERY_CONFLICT = """
+    DO $$ BEGIN
+        RAISE EXCEPTION 'canceling statement due to conflict with recovery' USING ERRCODE = '40001';
+    END $$
+"""
+
+
+@pytest.fixture
+def replica(app_modules):
+    """A Replica whose pool connects to the test database."""
+    from database import get_db_url
+    from replicas import Replica
+
+    replica = Replica(get_db_url(), retry_interval=30)
+    yield replica
+    replica.pool.closeall()
+
+
+def test_recovery_conflict_fails_over_without_marking_replica_down(replica):
+    """Test that a query cancelled by WAL replay goes to the primary and the replica stays in rotation."""
+    from replicas import ReplicaUnavailableError
+
+    with pytest.raises(ReplicaUnavailableError):
+        replica.run(lambda cursor: cursor.execute(RECOVERY_CONFLICT))
+
+    assert replica.healthy
+    assert replica.failures == 0
+    # The connection went back to the pool instead of being discarded
+    assert replica.pool.stats()["idle"] == 1
+
+
+def test_lost_connection_marks_replica_down(replica):
+    """Test that a replica whose connection dies is taken out of rotation."""
+    from replicas import ReplicaUnavailableError
+
+    with pytest.raises(ReplicaUnavailableError):
+        replica.run(lambda cursor: cursor.execute("SELECT pg_terminate_backend(pg_backend_pid())"))
+
+    assert not replica.healthy
+    assert replica.failures == 1
@@ -0,0 +1,124 @@
+"""
+Sales rollup tests that run checkouts in-process against the test database.
+"""
+
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def restore_sales(restore_inventory, db_connection):
+    """Put the daily_sales rollup back as it was afterwards."""
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT sales_date, product_id, order_count, quantity, revenue FROM daily_sales")
+    saved = cursor.fetchall()
+    db_connection.commit()
+    yield
+    cursor.execute("DELETE FROM daily_sales")
+    cursor.executemany(
+        "INSERT INTO daily_sales (sales_date, product_id, order_count, quantity, revenue) VALUES (%s, %s, %s, %s, %s)",
+        saved
+    )
+    db_connection.commit()
+    cursor.close()
+
+
+def rollup_row(db_connection, product_id):
+    """(order_count, quantity, revenue) of today's rollup row for a product"""
+    cursor = db_connection.cursor()
+    cursor.execute(
+        "SELECT order_count, quantity, revenue FROM daily_sales WHERE sales_date = CURRENT_DATE AND product_id = %s",
+        (product_id,)
+    )
+    row = cursor.fetchone()
+    db_connection.commit()
+    cursor.close()
+    return row or (0, 0, 0)
+
+
+def wait_until_applied(db_connection, order_id):
+    """Drain until the order has left the outbox (a server's worker may be draining too)"""
+    from reports import drain_sales_outbox
+
+    cursor = db_connection.cursor()
+    deadline = time.monotonic() + 10
+    while True:
+        drain_sales_outbox()
+        cursor.execute("SELECT COUNT(*) FROM sales_outbox WHERE order_id = %s", (order_id,))
+        pending = cursor.fetchone()[0]
+        db_connection.commit()
+        if not pending:
+            break
+        assert time.monotonic() < deadline, f"order {order_id} was never applied to the rollup"
+        time.sleep(0.05)
+    cursor.close()
+
+
+def test_checkout_does_not_wait_on_the_rollup(restore_sales, db_connection, monkeypatch):
+    """Test that checkout completes while another transaction holds the rollup."""
+    from orders import create_order
+
+    monkeypatch.setenv("INVENTORY_ASYNC", "false")
+    cursor = db_connection.cursor()
+    cursor.execute("LOCK TABLE daily_sales IN EXCLUSIVE MODE")
+    result = {}
+    try:
+        thread = threading.Thread(target=lambda: result.update(order_id=create_order([{"product_id": 1, "quantity": 1}])))
+        thread.start()
+        thread.join(timeout=10)
+        assert not thread.is_alive(), "checkout blocked on daily_sales"
+    finally:
+        db_connection.rollback()
+        cursor.close()
+
+    assert result["order_id"] is not None
+
+
+def test_orders_and_cancellations_reach_the_rollup(restore_sales, db_connection, monkeypatch):
+    """Test that the drained rollup counts a placed order and drops it again on cancellation."""
+    from fulfillment import transition_orders
+    from orders import create_order
+
+    monkeypatch.setenv("INVENTORY_ASYNC", "false")
+    count, quantity, revenue = rollup_row(db_connection, 1)
+
+    order_id = create_order([{"product_id": 1, "quantity": 2}])
+    wait_until_applied(db_connection, order_id)
+
+    new_count, new_quantity, new_revenue = rollup_row(db_connection, 1)
+    assert new_count == count + 1
+    assert new_quantity == quantity + 2
+    assert new_revenue > revenue
+
+    assert transition_orders([order_id], "cancelled") == ([order_id], [])
+    wait_until_applied(db_connection, order_id)
+
+    assert rollup_row(db_connection, 1) == (count, quantity, revenue)
+
+
+def test_rebuild_drops_queued_orders_it_counts(restore_sales, db_connection, monkeypatch):
+    """Test that rebuilding the rollup does not count a still-queued order twice."""
+    from orders import create_order
+    from reports import drain_sales_outbox, rebuild_sales_rollup
+
+    monkeypatch.setenv("INVENTORY_ASYNC", "false")
+    order_id = create_order([{"product_id": 1, "quantity": 3}])
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT order_date::date FROM orders WHERE id = %s", (order_id,))
+    order_day = cursor.fetchone()[0]
+    db_connection.commit()
+
+    rebuild_sales_rollup(order_day)
+    drain_sales_outbox()
+
+    cursor.execute(
+        """SELECT COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.quantity * oi.price)
+           FROM orders o JOIN order_items oi ON oi.order_id = o.id
+           WHERE o.order_date::date = CURRENT_DATE AND o.status <> 'cancelled' AND oi.product_id = 1"""
+    )
+    expected = cursor.fetchone()
+    db_connection.commit()
+    cursor.close()
+    assert rollup_row(db_connection, 1) == expected
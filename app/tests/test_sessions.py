@@ -0,0 +1,106 @@
+"""
+Server-side session store tests against the test database and a temporary SQLite file.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture(params=["postgres", "sqlite"])
+def store(request, app_modules, db_connection, tmp_path):
+    """Each session store, with the Postgres rows it wrote removed afterwards."""
+    from sessions import PostgresSessionStore, SQLiteSessionStore
+
+    if request.param == "sqlite":
+        yield SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        return
+    yield PostgresSessionStore()
+    cursor = db_connection.cursor()
+    cursor.execute("DELETE FROM sessions WHERE id LIKE 'test-%%'")
+    db_connection.commit()
+    cursor.close()
+
+
+def in_hours(hours):
+    return datetime.now(timezone.utc) + timedelta(hours=hours)
+
+
+def test_save_load_and_delete(store):
+    """Test that a session reads back as written, is overwritten in place and can be deleted."""
+    expires_at = in_hours(1)
+    store.save("test-round-trip", json.dumps({"cart": [1]}), expires_at)
+
+    data, loaded_expiry = store.load("test-round-trip")
+    assert json.loads(data) == {"cart": [1]}
+    assert abs(loaded_expiry - expires_at) < timedelta(seconds=1)
+
+    store.save("test-round-trip", json.dumps({"cart": [1, 2]}), in_hours(2))
+    data, loaded_expiry = store.load("test-round-trip")
+    assert json.loads(data) == {"cart": [1, 2]}
+    assert loaded_expiry > expires_at
+
+    store.delete("test-round-trip")
+    assert store.load("test-round-trip") is None
+    assert store.load("test-never-saved") is None
+
+
+def test_expired_sessions_are_not_loaded_and_are_swept(store):
+    """Test that an expired session reads as missing and sweep() removes only expired ones."""
+    store.save("test-expired-1", "{}", in_hours(-1))
+    store.save("test-expired-2", "{}", in_hours(-2))
+    store.save("test-live", "{}", in_hours(1))
+
+    assert store.load("test-expired-1") is None
+
+    # Batches of one walk the loop; the Postgres table may hold other expired sessions
+    assert store.sweep(batch_size=1) >= 2
+    assert store.sweep() == 0
+    assert store.load("test-live") is not None
+
+
+def test_expired_session_starts_empty(app_modules, monkeypatch, tmp_path):
+    """Test that once its stored session expires, a browser gets a new, empty one."""
+    monkeypatch.setenv("SESSION_BACKEND", "sqlite")
+    monkeypatch.setenv("SESSION_SQLITE_PATH", str(tmp_path / "sessions.db"))
+    from app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    assert client.post("/cart/add/1", data={"quantity": "1"}).status_code == 302
+    store = app.session_interface.store
+    sid = app.session_interface._signer(app).unsign(
+        client.get_cookie(app.config["SESSION_COOKIE_NAME"]).value
+    ).decode()
+    data, _ = store.load(sid)
+    store.save(sid, data, in_hours(-1))
+
+    assert "Your cart is empty" in client.get("/cart").get_data(as_text=True)
+
+
+def test_read_only_requests_do_not_rewrite_the_session(app_modules, monkeypatch, tmp_path):
+    """Test that an unmodified session is written back only once half its lifetime is gone."""
+    monkeypatch.setenv("SESSION_BACKEND", "sqlite")
+    monkeypatch.setenv("SESSION_SQLITE_PATH", str(tmp_path / "sessions.db"))
+    from app import create_app
+
+    app = create_app()
+    store = app.session_interface.store
+    saves = []
+    save = store.save
+    monkeypatch.setattr(store, "save", lambda *args: saves.append(args[0]) or save(*args))
+    client = app.test_client()
+    client.post("/cart/add/1", data={"quantity": "1"})
+    assert len(saves) == 1
+
+    client.get("/cart")
+    client.get("/cart")
+    assert len(saves) == 1
+
+    # Less than half the lifetime left: the next view slides the expiry
+    sid = saves[0]
+    data, _ = store.load(sid)
+    save(sid, data, datetime.now(timezone.utc) + app.session_interface.lifetime / 3)
+    client.get("/cart")
+    assert saves == [sid, sid]
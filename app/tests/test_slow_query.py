@@ -0,0 +1,55 @@
+"""
+Slow query log tests that run statements in-process against the test database.
+"""
+
+import logging
+import pytest
+
+
+@pytest.fixture
+def explain_every_statement(app_modules, monkeypatch):
+    """Log every statement as slow and capture a plan for all of them."""
+    import slow_query
+    monkeypatch.setattr(slow_query, "SLOW_QUERY_THRESHOLD", 1e-9)
+    monkeypatch.setattr(slow_query, "EXPLAIN_SAMPLE_RATE", 1.0)
+    monkeypatch.setenv("DB_PREPARED_STATEMENTS", "true")
+
+
+def run_prepared(name, sql, params):
+    """Run ``sql`` as the prepared statement ``name`` on a fresh connection"""
+    import psycopg2
+    from database import InstrumentedCursor, execute_prepared, get_db_url, register_statement
+
+    register_statement(name, sql)
+    conn = psycopg2.connect(get_db_url())
+    try:
+        cursor = conn.cursor(cursor_factory=InstrumentedCursor)
+        execute_prepared(cursor, name, params)
+        cursor.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def slow_query_messages(caplog):
+    return [record.getMessage() for record in caplog.records if record.name == "slow_query"]
+
+
+def test_prepared_select_is_explained(explain_every_statement, caplog):
+    """Test that EXECUTE of a registered SELECT gets a plan in the slow query log."""
+    caplog.set_level(logging.WARNING, logger="slow_query")
+    run_prepared("test_slow_select", "SELECT id, name FROM products WHERE id = %s", (1,))
+
+    executes = [message for message in slow_query_messages(caplog) if "EXECUTE test_slow_select" in message]
+    assert executes
+    assert "actual time=" in executes[0]
+
+
+def test_prepared_locking_select_is_not_explained(explain_every_statement, caplog):
+    """Test that EXECUTE of a registered SELECT ... FOR UPDATE is logged without re-running it."""
+    caplog.set_level(logging.WARNING, logger="slow_query")
+    run_prepared("test_slow_lock", "SELECT quantity FROM inventory WHERE product_id = %s FOR UPDATE", (1,))
+
+    executes = [message for message in slow_query_messages(caplog) if "EXECUTE test_slow_lock" in message]
+    assert executes
+    assert "actual time=" not in executes[0]
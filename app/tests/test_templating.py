@@ -0,0 +1,39 @@
+"""
+Template bytecode cache tests that render pages from both storefronts in-process.
+"""
+
+import asyncio
+
+
+def render_flask_index():
+    from app import create_app
+    response = create_app().test_client().get("/")
+    return response.status_code, response.get_data(as_text=True)
+
+
+def render_asgi_index():
+    from asgi_app import create_asgi_app
+
+    async def render():
+        app = create_asgi_app()
+        async with app.test_app():
+            response = await app.test_client().get("/")
+            return response.status_code, await response.get_data(as_text=True)
+
+    return asyncio.run(render())
+
+
+def test_sync_and_async_apps_share_a_cache_directory(app_modules, monkeypatch, tmp_path):
+    """Test that the Flask and Quart apps never load each other's cached bytecode."""
+    monkeypatch.setenv("TEMPLATE_BYTECODE_CACHE", "true")
+    monkeypatch.setenv("TEMPLATE_BYTECODE_CACHE_DIR", str(tmp_path))
+
+    # Each new app has an empty in-memory template cache and loads from disk
+    for render in (render_flask_index, render_asgi_index, render_flask_index, render_asgi_index):
+        status, html = render()
+        assert status == 200
+        assert "Plain Bagel" in html
+
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert any(name.startswith("__jinja2_async_") for name in names)
+    assert any(not name.startswith("__jinja2_async_") for name in names)
@@ -0,0 +1,15 @@
+--liquibase formatted sql
+--changeset demo:008-create-inventory-stripes
+
+-- Striped stock counters: optionally spreads a product's stock across several
+-- rows so concurrent checkouts for the same bagel lock different rows.
+-- Stock for a product is inventory.quantity plus the sum of its stripes.
+CREATE TABLE inventory_stripes (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    stripe SMALLINT NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, stripe)
+);
+
+--rollback DROP TABLE inventory_stripes;
@@ -0,0 +1,16 @@
+--liquibase formatted sql
+--changeset demo:009-create-inventory-outbox
+
+-- Outbox of pending inventory decrements, written with each order when
+-- asynchronous inventory updates are enabled and drained in batches
+CREATE TABLE inventory_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    quantity INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_inventory_outbox_product_id ON inventory_outbox(product_id);
+
+--rollback DROP TABLE inventory_outbox;
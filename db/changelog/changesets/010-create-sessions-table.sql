@@ -0,0 +1,14 @@
+--liquibase formatted sql
+--changeset demo:010-create-sessions-table
+
+-- Server-side session storage (SESSION_BACKEND=postgres); the cookie only
+-- carries a signed session id
+CREATE TABLE sessions (
+    id VARCHAR(64) PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX idx_sessions_expires_at ON sessions(expires_at);
+
+--rollback DROP TABLE sessions;
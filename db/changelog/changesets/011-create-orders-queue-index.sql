@@ -0,0 +1,8 @@
+--liquibase formatted sql
+--changeset demo:011-create-orders-queue-index
+
+-- Keyset pagination of the fulfillment queue:
+-- WHERE status = ? AND (order_date, id) > (?, ?) ORDER BY order_date, id
+CREATE INDEX idx_orders_status_date_id ON orders(status, order_date, id);
+
+--rollback DROP INDEX IF EXISTS idx_orders_status_date_id;
@@ -0,0 +1,23 @@
+--liquibase formatted sql
+--changeset demo:012-create-daily-sales
+
+-- Per-day, per-product sales rollup maintained by checkout (and reversed on
+-- cancellation), so sales reports never aggregate orders and order_items
+CREATE TABLE daily_sales (
+    sales_date DATE NOT NULL,
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    order_count INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (sales_date, product_id)
+);
+
+-- Backfill from orders placed before the rollup existed
+INSERT INTO daily_sales (sales_date, product_id, order_count, quantity, revenue)
+SELECT o.order_date::date, oi.product_id, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.quantity * oi.price)
+FROM orders o
+JOIN order_items oi ON oi.order_id = o.id
+WHERE o.status <> 'cancelled' AND o.order_date IS NOT NULL
+GROUP BY o.order_date::date, oi.product_id;
+
+--rollback DROP TABLE daily_sales;
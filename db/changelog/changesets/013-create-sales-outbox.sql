@@ -0,0 +1,17 @@
+--liquibase formatted sql
+--changeset demo:013-create-sales-outbox
+
+-- Orders placed (sign 1) or cancelled (sign -1) but not yet folded into
+-- daily_sales. Checkout appends here instead of upserting the day's rollup
+-- rows, which every checkout would otherwise queue on; the outbox worker
+-- applies them in batches
+CREATE TABLE sales_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+    sign SMALLINT NOT NULL CHECK (sign IN (1, -1)),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_sales_outbox_order_id ON sales_outbox(order_id);
+
+--rollback DROP TABLE sales_outbox;
@@ -0,0 +1,15 @@
+--liquibase formatted sql
+--changeset demo:014-create-catalog-version
+
+-- Single-row counter bumped by every catalog import. Each worker process
+-- polls it and drops its in-process catalog cache when it changes, so an
+-- import made through one worker reaches all of them
+CREATE TABLE catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO catalog_version (id, version) VALUES (1, 0);
+
+--rollback DROP TABLE catalog_version;